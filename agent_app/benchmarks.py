@@ -0,0 +1,124 @@
+"""
+Scaling benchmark for the sharded workflow worker pool.
+
+Runs the same batch of workflows through pools of 1..N processes and reports
+throughput, speedup and latency percentiles for each pool size:
+
+    DJANGO_SETTINGS_MODULE=settings python -m agent_app.benchmarks --workflows 200 --max-processes 8
+"""
+import argparse
+import os
+import time
+import uuid
+from concurrent.futures import wait
+from typing import Dict, List, Any, Optional
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values, 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def workflow_failed(result: Dict[str, Any]) -> bool:
+    """Whether a workflow result is degraded, not just whether it raised
+
+    The agent reports success even when MCP calls fail (e.g. connection refused),
+    so failed server calls and stage errors count as failures too.
+    """
+    if not result.get('success', False) or result.get('errors'):
+        return True
+    return any(
+        not server_call.get('success', False)
+        for log_entry in result.get('stage_logs', [])
+        for server_call in log_entry.get('server_calls', [])
+    )
+
+
+def _sample_input(index: int):
+    from agent_app.schemas import CustomerSupportInput
+
+    return CustomerSupportInput(
+        customer_name=f"Benchmark Customer {index}",
+        customer_email=f"customer{index}@example.com",
+        query="My internet connection has been slow for the past week. Can you help me fix this issue?",
+        ticket_id=str(uuid.uuid4())
+    )
+
+
+def run_pool_benchmark(processes: int, num_workflows: int) -> Dict[str, Any]:
+    """Run num_workflows through a pool of the given size and return timing stats"""
+    from agent_app.worker_pool import WorkflowWorkerPool
+
+    with WorkflowWorkerPool(processes=processes) as pool:
+        # Warm up so process spawn and graph compilation are not measured
+        wait([pool.submit(_sample_input(i)) for i in range(processes * 2)])
+
+        latencies: List[float] = []
+        started = time.perf_counter()
+        futures = []
+        for i in range(num_workflows):
+            submitted_at = time.perf_counter()
+            future = pool.submit(_sample_input(i))
+            future.add_done_callback(
+                lambda _, submitted_at=submitted_at: latencies.append(time.perf_counter() - submitted_at)
+            )
+            futures.append(future)
+        wait(futures)
+        elapsed = time.perf_counter() - started
+
+    failures = sum(
+        1 for future in futures
+        if future.exception() is not None or workflow_failed(future.result())
+    )
+    return {
+        'processes': processes,
+        'workflows': num_workflows,
+        'failures': failures,
+        'elapsed_s': elapsed,
+        'throughput_per_s': num_workflows / elapsed if elapsed else 0.0,
+        'p50_latency_s': percentile(latencies, 50),
+        'p99_latency_s': percentile(latencies, 99)
+    }
+
+
+def benchmark_worker_pool_scaling(num_workflows: int = 200,
+                                  max_processes: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Measure worker pool throughput from 1 to max_processes cores"""
+    max_processes = max_processes or os.cpu_count() or 1
+    results = []
+    for processes in range(1, max_processes + 1):
+        stats = run_pool_benchmark(processes, num_workflows)
+        baseline = results[0]['throughput_per_s'] if results else stats['throughput_per_s']
+        stats['speedup'] = stats['throughput_per_s'] / baseline if baseline else 0.0
+        stats['efficiency'] = stats['speedup'] / processes
+        results.append(stats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark workflow worker pool scaling")
+    parser.add_argument('--workflows', type=int, default=200)
+    parser.add_argument('--max-processes', type=int, default=None)
+    args = parser.parse_args()
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+    django.setup()
+
+    print(f"{'procs':>5} {'wf/s':>10} {'speedup':>8} {'eff':>6} {'p50 s':>8} {'p99 s':>8} {'fail':>5}")
+    for stats in benchmark_worker_pool_scaling(args.workflows, args.max_processes):
+        print(f"{stats['processes']:>5} {stats['throughput_per_s']:>10.2f} {stats['speedup']:>8.2f} "
+              f"{stats['efficiency']:>6.2f} {stats['p50_latency_s']:>8.3f} {stats['p99_latency_s']:>8.3f} "
+              f"{stats['failures']:>5}")
+        if stats['failures'] == stats['workflows']:
+            print("      every workflow failed; are the MCP servers in MCP_SERVERS running? "
+                  "These numbers time the error path.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Offline capacity simulator for workflow configurations.
+
+Runs the real compiled LangGraph workflow on a virtual-time event loop, with MCP
+clients replaced by replays of latencies and results captured in MCP_RECORDING
+mode. Workflows arrive as a Poisson process at a given rate and run with a given
+concurrency; the report predicts throughput, queueing and latency percentiles.
+
+    DJANGO_SETTINGS_MODULE=settings python -m agent_app.capacity_simulator \\
+        --recording mcp_recordings.jsonl --arrival-rate 5 --arrival-rate 10 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import selectors
+import uuid
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple
+
+from agent_app.benchmarks import percentile, workflow_failed
+
+logger = logging.getLogger(__name__)
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    """Selector that jumps the loop's clock forward instead of blocking"""
+
+    def __init__(self, loop: 'VirtualTimeEventLoop'):
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise RuntimeError("Simulation stalled: nothing scheduled and nothing ready")
+        if timeout > 0:
+            self._loop.virtual_now += timeout
+        return super().select(0)
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose clock only advances when every task is waiting on a timer.
+
+    asyncio.sleep() and timeouts complete instantly in wall-clock time, so hours
+    of simulated traffic run in seconds. Real I/O must not be used on this loop.
+    """
+
+    def __init__(self):
+        self.virtual_now = 0.0
+        super().__init__(selector=_VirtualTimeSelector(self))
+
+    def time(self) -> float:
+        return self.virtual_now
+
+
+class ReplayMCPClient:
+    """
+    Stands in for MCPClient, sampling recorded latency and results per ability.
+
+    Each ability samples from its own seeded stream, so the sequence of samples
+    it sees does not shift when a config change alters how calls interleave.
+    """
+
+    def __init__(self, server_name: str, recordings: Dict[Tuple[str, str], List[Dict[str, Any]]],
+                 seed: int, default_latency: float, server_concurrency: Optional[int] = None):
+        self.server_name = server_name
+        self.recordings = recordings
+        self.seed = seed
+        self._rngs: Dict[str, random.Random] = {}
+        self.default_latency = default_latency
+        self.server_concurrency = server_concurrency
+        self._server_slots: Optional[asyncio.Semaphore] = None
+        self.unrecorded_abilities = set()
+
+    async def execute_ability(self, ability_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        samples = self.recordings.get((self.server_name, ability_name))
+        if samples:
+            if ability_name not in self._rngs:
+                self._rngs[ability_name] = random.Random(f"{self.seed}:{self.server_name}:{ability_name}")
+            sample = self._rngs[ability_name].choice(samples)
+        else:
+            self.unrecorded_abilities.add(ability_name)
+            sample = {'latency': self.default_latency, 'success': True, 'data': {}}
+
+        if self.server_concurrency:
+            # Model finite server capacity: calls beyond it wait before being served
+            if self._server_slots is None:
+                self._server_slots = asyncio.Semaphore(self.server_concurrency)
+            async with self._server_slots:
+                await asyncio.sleep(sample['latency'])
+        else:
+            await asyncio.sleep(sample['latency'])
+
+        if sample.get('success', False):
+            return {
+                'success': True,
+                'data': sample.get('data', {}),
+                'server': self.server_name,
+                'ability': ability_name
+            }
+        return {
+            'success': False,
+            'error': sample.get('error') or 'Recorded failure',
+            'server': self.server_name,
+            'ability': ability_name
+        }
+
+    def close(self):
+        pass
+
+
+async def _discard_payloads(entries: Dict[str, Any], ttl: int):
+    """Side store stand-in: simulated workflows keep their refs but nothing is stored"""
+
+
+def _sample_input(rng: random.Random, index: int, priority_mix: Dict[str, float]):
+    from agent_app.schemas import CustomerSupportInput
+
+    priorities, weights = zip(*priority_mix.items())
+    return CustomerSupportInput(
+        customer_name=f"Simulated Customer {index}",
+        customer_email=f"customer{index}@example.com",
+        query="My internet connection has been slow for the past week. Can you help me fix this issue?",
+        priority=rng.choices(priorities, weights)[0],
+        ticket_id=str(uuid.UUID(int=rng.getrandbits(128)))
+    )
+
+
+async def _run_arrivals(agent, arrival_rate: float, concurrency: int, num_workflows: int,
+                        seed: int, priority_mix: Dict[str, float]) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    completed: List[Dict[str, Any]] = []
+    queue = {'depth': 0, 'max_depth': 0}
+    # Separate streams so arrivals and inputs stay identical across compared configs
+    arrival_rng = random.Random(f"{seed}:arrivals")
+    input_rng = random.Random(f"{seed}:inputs")
+
+    async def run_workflow(input_data):
+        arrived_at = loop.time()
+        queue['depth'] += 1
+        queue['max_depth'] = max(queue['max_depth'], queue['depth'])
+        async with slots:
+            queue['depth'] -= 1
+            started_at = loop.time()
+            result = await agent.process_customer_support_request(input_data)
+        completed.append({
+            'arrived_at': arrived_at,
+            'started_at': started_at,
+            'finished_at': loop.time(),
+            'failed': workflow_failed(result),
+            'failed_calls': sum(
+                1 for log_entry in result.get('stage_logs', [])
+                for server_call in log_entry.get('server_calls', [])
+                if not server_call.get('success', False)
+            ),
+            'stages': [log_entry['stage'] for log_entry in result.get('stage_logs', [])]
+        })
+
+    tasks = []
+    for index in range(num_workflows):
+        tasks.append(asyncio.create_task(run_workflow(_sample_input(input_rng, index, priority_mix))))
+        await asyncio.sleep(arrival_rng.expovariate(arrival_rate))
+    await asyncio.gather(*tasks)
+
+    latencies = [run['finished_at'] - run['arrived_at'] for run in completed]
+    queue_waits = [run['started_at'] - run['arrived_at'] for run in completed]
+    service_times = [run['finished_at'] - run['started_at'] for run in completed]
+    makespan = (
+        max(run['finished_at'] for run in completed) - min(run['arrived_at'] for run in completed)
+    ) if completed else 0.0
+
+    return {
+        'workflows': num_workflows,
+        'failed': sum(1 for run in completed if run['failed']),
+        'failed_calls': sum(run['failed_calls'] for run in completed),
+        'simulated_seconds': makespan,
+        'throughput_per_s': len(completed) / makespan if makespan else 0.0,
+        'max_queue_depth': queue['max_depth'],
+        'utilization': sum(service_times) / (makespan * concurrency) if makespan else 0.0,
+        'latency_s': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99)
+        },
+        'queue_wait_s': {
+            'p50': percentile(queue_waits, 50),
+            'p99': percentile(queue_waits, 99)
+        },
+        'service_time_s': {
+            'p50': percentile(service_times, 50),
+            'p99': percentile(service_times, 99)
+        },
+        'stage_visits': dict(Counter(stage for run in completed for stage in run['stages']))
+    }
+
+
+def simulate(recordings: Dict[Tuple[str, str], List[Dict[str, Any]]], arrival_rate: float,
+             concurrency: int, num_workflows: int = 1000, workflow_stages=None, agent_class=None,
+             server_concurrency: Optional[Dict[str, int]] = None,
+             priority_mix: Optional[Dict[str, float]] = None, seed: int = 0) -> Dict[str, Any]:
+    """
+    Predict throughput, queueing and latency for a workflow configuration.
+
+    workflow_stages defaults to WORKFLOW_STAGES and agent_class to
+    LangGraphCustomerSupportAgent; pass a subclass to evaluate routing changes.
+    server_concurrency optionally caps concurrent calls each MCP server can serve.
+    """
+    from agent_app.lang_graph_agent import LangGraphCustomerSupportAgent
+
+    agent_class = agent_class or LangGraphCustomerSupportAgent
+    priority_mix = priority_mix or {'medium': 1.0}
+    server_concurrency = server_concurrency or {}
+
+    all_latencies = [sample['latency'] for samples in recordings.values() for sample in samples]
+    default_latency = percentile(all_latencies, 50)
+
+    # One limiter set with the full configured limits models the pool's combined shards
+    agent = agent_class(workflow_stages, concurrency_shards=1)
+    orchestrator = agent.mcp_orchestrator
+    orchestrator.close()
+    orchestrator.recorder = None
+    # Keep simulated payloads out of the shared side store the web process serves refs from
+    agent.store_payloads = _discard_payloads
+    orchestrator.atlas_client, orchestrator.common_client = [
+        ReplayMCPClient(server_name, recordings, seed, default_latency, server_concurrency.get(server_name))
+        for server_name in ('atlas', 'common')
+    ]
+
+    loop = VirtualTimeEventLoop()
+    try:
+        report = loop.run_until_complete(
+            _run_arrivals(agent, arrival_rate, concurrency, num_workflows, seed, priority_mix)
+        )
+        report['concurrency_limits'] = orchestrator.get_concurrency_metrics()
+    finally:
+        loop.close()
+
+    report.update({
+        'arrival_rate': arrival_rate,
+        'concurrency': concurrency,
+        'unrecorded_abilities': sorted(
+            orchestrator.atlas_client.unrecorded_abilities | orchestrator.common_client.unrecorded_abilities
+        )
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate workflow capacity from recorded MCP latencies")
+    parser.add_argument('--recording', required=True, help="JSON-lines file written in MCP_RECORDING mode")
+    parser.add_argument('--arrival-rate', type=float, action='append', required=True,
+                        help="Workflows per second; repeat to sweep several rates")
+    parser.add_argument('--concurrency', type=int, default=16, help="Workflows allowed in flight at once")
+    parser.add_argument('--workflows', type=int, default=1000)
+    parser.add_argument('--stages', default=None,
+                        help="Dotted path to an alternative stage config, e.g. myconfigs.REORDERED_STAGES")
+    parser.add_argument('--server-concurrency', action='append', default=[], metavar='SERVER=N',
+                        help="Cap concurrent calls an MCP server can serve")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+    django.setup()
+    logging.basicConfig(level=logging.WARNING)
+
+    from django.utils.module_loading import import_string
+    from agent_app.recording import load_recordings
+
+    recordings = load_recordings(args.recording)
+    workflow_stages = import_string(args.stages) if args.stages else None
+    server_concurrency = {
+        name: int(limit) for name, limit in (item.split('=', 1) for item in args.server_concurrency)
+    }
+
+    reports = [
+        simulate(recordings, arrival_rate, args.concurrency, args.workflows,
+                 workflow_stages=workflow_stages, server_concurrency=server_concurrency, seed=args.seed)
+        for arrival_rate in args.arrival_rate
+    ]
+    print(json.dumps(reports, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import asyncio
+import math
+import threading
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> float:
+    """Event loop clock when inside one, so limits behave the same under simulated time"""
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a call cannot get a concurrency slot within its bounded wait"""
+
+
+class _Waiter:
+    """A queued acquire; granted is decided under the limiter lock, the future is resolved on its own loop"""
+    __slots__ = ('loop', 'future', 'granted')
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limiter for calls to a single MCP server or ability.
+
+    The limit grows by roughly one slot per window of calls that finish within
+    target_latency while demand is at the limit, and shrinks multiplicatively
+    (at most once per observed latency) when calls are slow or fail. Calls over
+    the limit wait in a FIFO queue bounded by max_queue and queue_timeout.
+
+    A limiter is thread-safe and may be shared by workflows running on different
+    event loops in one process. Limits and queue size are configured for the whole
+    deployment; with shards > 1 (one limiter per process) each gets its share.
+    """
+
+    def __init__(self, name: str, initial_limit: int = 10, min_limit: int = 1, max_limit: int = 100,
+                 target_latency: float = 1.0, max_queue: int = 100, queue_timeout: float = 5.0,
+                 backoff_ratio: float = 0.9, shards: int = 1):
+        initial_limit, min_limit, max_limit, max_queue = (
+            max(1, math.ceil(value / shards)) for value in (initial_limit, min_limit, max_limit, max_queue)
+        )
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff_ratio = backoff_ratio
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._waiters: deque = deque()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latency_ewma: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if the limit is reached"""
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return
+
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise ConcurrencyLimitExceeded(f"{self.name}: queue full ({self.max_queue} waiting)")
+
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if waiter.granted:
+                    # The slot was handed over just before we gave up; give it back
+                    self.in_flight -= 1
+                    self._wake_waiters()
+                else:
+                    self._discard_waiter(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.rejected += 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise ConcurrencyLimitExceeded(f"{self.name}: no slot within {self.queue_timeout}s")
+            raise
+
+    def release(self, latency: Optional[float] = None, success: bool = True):
+        """Return a slot and feed the call's latency and outcome into the limit
+
+        Without a latency the slot is returned without adjusting the limit,
+        e.g. when the call never reached the server.
+        """
+        with self._lock:
+            saturated = bool(self._waiters) or self.in_flight >= self.limit
+            self.in_flight -= 1
+
+            if latency is not None:
+                self._record_sample(latency, success, saturated)
+
+            self._wake_waiters()
+
+    def _record_sample(self, latency: float, success: bool, saturated: bool):
+        self.completed += 1
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+
+        if not success or latency > self.target_latency:
+            now = _now()
+            if now - self._last_decrease >= latency:
+                self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+                self._last_decrease = now
+                logger.debug(f"⬇️ {self.name} concurrency limit decreased to {self.limit}")
+        elif saturated:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limit, load and counters for metrics"""
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queue_depth,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'latency_ewma': self.latency_ewma,
+                'target_latency': self.target_latency
+            }
+
+    def _wake_waiters(self):
+        """Hand free slots to queued waiters; callers must hold self._lock"""
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.future.done():
+                continue
+            waiter.granted = True
+            self.in_flight += 1
+            try:
+                waiter.loop.call_soon_threadsafe(_grant, waiter.future)
+            except RuntimeError:
+                # The waiter's loop is closed, so nobody will use the slot
+                waiter.granted = False
+                self.in_flight -= 1
+
+    def _discard_waiter(self, waiter: _Waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
@@ -1,16 +1,23 @@
 from langgraph import StateGraph, END
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 import asyncio
+import contextvars
 import logging
 from datetime import datetime
 
-from agent_app.schemas import AgentState, CustomerSupportInput
+from agent_app.schemas import AgentState, CustomerSupportInput, StageConfig
 from agent_app.workflow_config import WORKFLOW_STAGES
 from agent_app.mcp_clients import MCPOrchestrator
+from agent_app.payload_budgets import apply_payload_budget, store_payloads
+from agent_app.tracing import WorkflowTrace, trace_span
 from agent_app.models import AgentWorkflowState, CustomerSupportTicket
 
 logger = logging.getLogger(__name__)
 
+# Progress listener of the workflow run in the current context. Scoped per run rather than
+# per ticket, since concurrent runs of one ticket share a worker's agent.
+_progress_callback: contextvars.ContextVar = contextvars.ContextVar('workflow_progress_callback', default=None)
+
 class LangGraphCustomerSupportAgent:
     """
     Langie - The Lang Graph Customer Support Agent
@@ -19,8 +26,13 @@ class LangGraphCustomerSupportAgent:
     and orchestrates MCP clients for ability execution.
     """
     
-    def __init__(self):
-        self.mcp_orchestrator = MCPOrchestrator()
+    def __init__(self, workflow_stages: Optional[Dict[str, StageConfig]] = None,
+                 concurrency_shards: Optional[int] = None):
+        # Stage configuration is injectable so alternative workflows can be simulated
+        self.workflow_stages = workflow_stages or WORKFLOW_STAGES
+        self.mcp_orchestrator = MCPOrchestrator(concurrency_shards=concurrency_shards)
+        # Writer for payload budget side stores; the capacity simulator swaps in a no-op
+        self.store_payloads = store_payloads
         self.workflow_graph = self._build_workflow_graph()
     
     def _build_workflow_graph(self) -> StateGraph:
@@ -28,7 +40,7 @@ class LangGraphCustomerSupportAgent:
         graph = StateGraph(AgentState)
         
         # Add all stage nodes
-        for stage_name, stage_config in WORKFLOW_STAGES.items():
+        for stage_name, stage_config in self.workflow_stages.items():
             if stage_config.mode.value == "deterministic":
                 graph.add_node(stage_name, self._execute_deterministic_stage)
             else:
@@ -37,7 +49,7 @@ class LangGraphCustomerSupportAgent:
         # Add edges based on stage configuration
         graph.set_entry_point("INTAKE")
         
-        for stage_name, stage_config in WORKFLOW_STAGES.items():
+        for stage_name, stage_config in self.workflow_stages.items():
             if stage_config.next_stage:
                 if stage_config.condition_field:
                     # Conditional routing for non-deterministic stages
@@ -59,69 +71,77 @@ class LangGraphCustomerSupportAgent:
     async def _execute_deterministic_stage(self, state: AgentState) -> AgentState:
         """Execute abilities sequentially for deterministic stages"""
         current_stage = state.current_stage
-        stage_config = WORKFLOW_STAGES[current_stage]
+        stage_config = self.workflow_stages[current_stage]
         
         logger.info(f"🔄 Executing deterministic stage: {current_stage}")
         
-        try:
-            # Execute abilities in sequence
-            results = await self.mcp_orchestrator.execute_abilities(
-                abilities=stage_config.abilities,
-                server_name=stage_config.mcp_server.value,
-                state=state
-            )
-            
-            # Update state based on stage results
-            state = self._update_state_from_results(state, current_stage, results)
-            
-            # Log stage execution
-            self._log_stage_execution(state, current_stage, stage_config.abilities, results, "SUCCESS")
-            
-            # Move to next stage
-            if stage_config.next_stage:
-                state.current_stage = stage_config.next_stage
-            
-        except Exception as e:
-            logger.error(f"❌ Error in stage {current_stage}: {str(e)}")
-            state.errors.append(f"Stage {current_stage}: {str(e)}")
-            self._log_stage_execution(state, current_stage, stage_config.abilities, [], "ERROR")
+        with trace_span(f"stage.{current_stage}", kind='stage', mode=stage_config.mode.value) as span:
+            try:
+                # Execute abilities in sequence
+                results = await self.mcp_orchestrator.execute_abilities(
+                    abilities=stage_config.abilities,
+                    server_name=stage_config.mcp_server.value,
+                    state=state
+                )
+                
+                # Update state based on stage results
+                with trace_span(f"merge.{current_stage}", kind='internal'):
+                    state = await self._update_state_from_results(state, current_stage, results)
+                
+                # Log stage execution
+                self._log_stage_execution(state, current_stage, stage_config.abilities, results, "SUCCESS")
+                
+                # Move to next stage
+                if stage_config.next_stage:
+                    state.current_stage = stage_config.next_stage
+                
+            except Exception as e:
+                logger.error(f"❌ Error in stage {current_stage}: {str(e)}")
+                state.errors.append(f"Stage {current_stage}: {str(e)}")
+                self._log_stage_execution(state, current_stage, stage_config.abilities, [], "ERROR")
+                if span:
+                    span['status'] = 'ERROR'
         
         return state
     
     async def _execute_non_deterministic_stage(self, state: AgentState) -> AgentState:
         """Execute abilities dynamically based on context for non-deterministic stages"""
         current_stage = state.current_stage
-        stage_config = WORKFLOW_STAGES[current_stage]
+        stage_config = self.workflow_stages[current_stage]
         
         logger.info(f"🎯 Executing non-deterministic stage: {current_stage}")
         
-        try:
-            # Dynamic ability selection based on context
-            abilities_to_execute = self._select_abilities_dynamically(state, stage_config)
-            
-            if abilities_to_execute:
-                results = await self.mcp_orchestrator.execute_abilities(
-                    abilities=abilities_to_execute,
-                    server_name=stage_config.mcp_server.value,
-                    state=state
-                )
+        with trace_span(f"stage.{current_stage}", kind='stage', mode=stage_config.mode.value) as span:
+            try:
+                # Dynamic ability selection based on context
+                abilities_to_execute = self._select_abilities_dynamically(state, stage_config)
                 
-                # Update state based on results
-                state = self._update_state_from_results(state, current_stage, results)
-                
-                self._log_stage_execution(state, current_stage, abilities_to_execute, results, "SUCCESS")
-            else:
-                logger.info(f"⏭️ Skipping {current_stage} - no abilities needed")
-                self._log_stage_execution(state, current_stage, [], [], "SKIPPED")
-            
-            # Move to next stage
-            if stage_config.next_stage:
-                state.current_stage = stage_config.next_stage
+                if abilities_to_execute:
+                    results = await self.mcp_orchestrator.execute_abilities(
+                        abilities=abilities_to_execute,
+                        server_name=stage_config.mcp_server.value,
+                        state=state
+                    )
+                    
+                    # Update state based on results
+                    with trace_span(f"merge.{current_stage}", kind='internal'):
+                        state = await self._update_state_from_results(state, current_stage, results)
+                    
+                    self._log_stage_execution(state, current_stage, abilities_to_execute, results, "SUCCESS")
+                else:
+                    logger.info(f"⏭️ Skipping {current_stage} - no abilities needed")
+                    self._log_stage_execution(state, current_stage, [], [], "SKIPPED")
                 
-        except Exception as e:
-            logger.error(f"❌ Error in stage {current_stage}: {str(e)}")
-            state.errors.append(f"Stage {current_stage}: {str(e)}")
-            self._log_stage_execution(state, current_stage, stage_config.abilities, [], "ERROR")
+                # Move to next stage
+                if stage_config.next_stage:
+                    state.current_stage = stage_config.next_stage
+                    
+            except Exception as e:
+                logger.error(f"❌ Error in stage {current_stage}: {str(e)}")
+                state.errors.append(f"Stage {current_stage}: {str(e)}")
+                self._log_stage_execution(state, current_stage, stage_config.abilities, [], "ERROR")
+                if span:
+                    span['status'] = 'ERROR'
         
         return state
     
@@ -156,7 +176,7 @@ class LangGraphCustomerSupportAgent:
         # Default: return all abilities for the stage
         return stage_config.abilities
     
-    def _update_state_from_results(self, state: AgentState, stage: str, results: List[Dict[str, Any]]) -> AgentState:
+    async def _update_state_from_results(self, state: AgentState, stage: str, results: List[Dict[str, Any]]) -> AgentState:
         """Update agent state based on stage execution results"""
         for result in results:
             if not result.get('success', False):
@@ -193,6 +213,22 @@ class LangGraphCustomerSupportAgent:
             elif ability == 'output_payload':
                 state.final_payload = data
         
+        # Enforce the stage's payload budgets before results flow to later stages
+        stage_config = self.workflow_stages.get(stage)
+        if stage_config:
+            for field_name, budget in stage_config.payload_budgets.items():
+                value = getattr(state, field_name, None)
+                if not isinstance(value, list):
+                    continue
+                trimmed, bytes_saved, side_store_entries = apply_payload_budget(
+                    value, budget, state.ticket_id, field_name
+                )
+                await self.store_payloads(side_store_entries, budget.side_store_ttl)
+                setattr(state, field_name, trimmed)
+                state.payload_bytes_saved[field_name] = state.payload_bytes_saved.get(field_name, 0) + bytes_saved
+                logger.info(f"✂️ Trimmed {field_name} for stage {stage}: {len(value)} -> {len(trimmed)} items, "
+                            f"{bytes_saved} bytes saved")
+        
         return state
     
     def _log_stage_execution(self, state: AgentState, stage: str, abilities: List[str], 
@@ -216,6 +252,13 @@ class LangGraphCustomerSupportAgent:
         
         state.stage_logs.append(log_entry)
         logger.info(f"📝 Logged execution for stage {stage}: {status}")
+        
+        progress_callback = _progress_callback.get()
+        if progress_callback:
+            try:
+                progress_callback(log_entry)
+            except Exception as e:
+                logger.warning(f"Progress callback failed for ticket {state.ticket_id}: {str(e)}")
     
     def _route_condition(self, state: AgentState) -> bool:
         """Route based on condition field for non-deterministic stages"""
@@ -225,8 +268,15 @@ class LangGraphCustomerSupportAgent:
             return not (state.escalation_required or False)  # Continue if no escalation needed
         return True
     
-    async def process_customer_support_request(self, input_data: CustomerSupportInput) -> Dict[str, Any]:
-        """Main entry point for processing customer support requests"""
+    async def process_customer_support_request(self, input_data: CustomerSupportInput,
+                                               progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                               trace_context: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """Main entry point for processing customer support requests
+        
+        If given, progress_callback is called with each stage log entry as the stage finishes.
+        Spans are recorded under trace_context when given (see WorkflowTrace.context) and
+        returned as 'trace'.
+        """
         logger.info(f"🚀 Starting customer support workflow for: {input_data.customer_name}")
         
         # Initialize agent state
@@ -239,18 +289,27 @@ class LangGraphCustomerSupportAgent:
             current_stage="INTAKE"
         )
         
+        callback_token = _progress_callback.set(progress_callback)
+        
+        trace_context = trace_context or {}
+        trace = WorkflowTrace(trace_context.get('trace_id'), trace_context.get('span_id'))
+        
         try:
             # Execute the workflow graph
-            final_state = await self.workflow_graph.ainvoke(initial_state)
+            with trace.activate(), trace.span('workflow.run', kind='workflow', ticket_id=initial_state.ticket_id):
+                final_state = await self.workflow_graph.ainvoke(initial_state)
             
-            logger.info(f"✅ Workflow completed for ticket {final_state.ticket_id}")
+            logger.info(f"✅ Workflow completed for ticket {final_state.ticket_id} "
+                        f"({sum(final_state.payload_bytes_saved.values())} payload bytes saved)")
             
             return {
                 'success': True,
                 'ticket_id': final_state.ticket_id,
                 'final_payload': final_state.final_payload,
                 'stage_logs': final_state.stage_logs,
-                'errors': final_state.errors
+                'errors': final_state.errors,
+                'payload_bytes_saved': final_state.payload_bytes_saved,
+                'trace': trace.to_dict()
             }
             
         except Exception as e:
@@ -259,5 +318,9 @@ class LangGraphCustomerSupportAgent:
                 'success': False,
                 'error': str(e),
                 'ticket_id': initial_state.ticket_id,
-                'stage_logs': initial_state.stage_logs
-            }
\ No newline at end of file
+                'stage_logs': initial_state.stage_logs,
+                'trace': trace.to_dict()
+            }
+        
+        finally:
+            _progress_callback.reset(callback_token)
\ No newline at end of file
@@ -1,13 +1,56 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import asyncio
+import functools
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
 from django.conf import settings
 import logging
 
+from agent_app.schemas import AgentState
+from agent_app.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+from agent_app.tracing import trace_span
+from agent_app.recording import get_recorder
+
 logger = logging.getLogger(__name__)
 
+def concurrency_shards_per_process() -> int:
+    """How many processes share the configured MCP concurrency limits outside the worker pool"""
+    return max(1, getattr(settings, 'MCP_CONCURRENCY', {}).get('web_processes', 1))
+
+
+def build_limiters(shards: int):
+    """Create server and per-ability limiters from MCP_SERVERS, each enforcing 1/shards of its limits"""
+    server_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+    ability_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+    for server_name, server_config in settings.MCP_SERVERS.items():
+        server_limiters[server_name] = AdaptiveConcurrencyLimiter(
+            server_name, shards=shards, **server_config.get('concurrency', {})
+        )
+        for ability, limiter_config in server_config.get('ability_concurrency', {}).items():
+            key = f"{server_name}.{ability}"
+            ability_limiters[key] = AdaptiveConcurrencyLimiter(key, shards=shards, **limiter_config)
+    return server_limiters, ability_limiters
+
+
+_shared_limiters = None
+_shared_limiters_lock = threading.Lock()
+
+
+def get_shared_limiters():
+    """Process-wide limiters shared by every orchestrator in this process, across threads and event loops"""
+    global _shared_limiters
+    with _shared_limiters_lock:
+        if _shared_limiters is None:
+            _shared_limiters = build_limiters(concurrency_shards_per_process())
+    return _shared_limiters
+
+
 class MCPClient:
-    def __init__(self, server_name: str):
+    def __init__(self, server_name: str, concurrency_shards: int = 1):
         self.server_name = server_name
         self.server_config = settings.MCP_SERVERS.get(server_name)
         if not self.server_config:
@@ -15,6 +58,19 @@ class MCPClient:
         
         self.base_url = self.server_config['url']
         self.capabilities = self.server_config['capabilities']
+        
+        # Long-lived HTTP session so connections to the MCP server are pooled
+        # and reused across ability calls instead of reopened per request
+        self.session = requests.Session()
+        # Sized to this process's share of the concurrency ceiling so the adaptive
+        # limiter, not the thread or connection pool, decides how many calls are outstanding
+        pool_size = self.server_config.get('pool_size') or max(1, math.ceil(
+            self.server_config.get('concurrency', {}).get('max_limit', 10) / concurrency_shards
+        ))
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f"mcp-{server_name}")
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
     
     async def execute_ability(self, ability_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Execute an ability on the MCP server"""
@@ -25,12 +81,16 @@ class MCPClient:
                 'server_capabilities': self.capabilities
             }
             
-            response = requests.post(
+            # Run the blocking HTTP call off the event loop so concurrent
+            # workflows sharing the loop are not serialized behind it
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, functools.partial(
+                self.session.post,
                 f"{self.base_url}/execute",
                 json=payload,
                 headers={'Content-Type': 'application/json'},
                 timeout=30
-            )
+            ))
             
             if response.status_code == 200:
                 result = response.json()
@@ -58,11 +118,33 @@ class MCPClient:
                 'server': self.server_name,
                 'ability': ability_name
             }
+    
+    def close(self):
+        """Release pooled connections to the MCP server"""
+        self.executor.shutdown(wait=False)
+        self.session.close()
 
 class MCPOrchestrator:
-    def __init__(self):
-        self.atlas_client = MCPClient('atlas')
-        self.common_client = MCPClient('common')
+    def __init__(self, concurrency_shards: Optional[int] = None):
+        """
+        By default the orchestrator uses this process's shared concurrency limiters, so
+        limits hold across every request the process serves. With concurrency_shards it
+        owns private limiters enforcing 1/concurrency_shards of the configured limits,
+        for long-lived orchestrators such as one per pool worker or a simulation.
+        """
+        if concurrency_shards is None:
+            # Adaptive concurrency limits per server, plus optional per-ability limits
+            self.server_limiters, self.ability_limiters = get_shared_limiters()
+            client_shards = concurrency_shards_per_process()
+        else:
+            self.server_limiters, self.ability_limiters = build_limiters(concurrency_shards)
+            client_shards = concurrency_shards
+        
+        self.atlas_client = MCPClient('atlas', client_shards)
+        self.common_client = MCPClient('common', client_shards)
+        
+        # Captures per-ability latency and results for the capacity simulator when enabled
+        self.recorder = get_recorder()
     
     def get_client(self, server_name: str) -> MCPClient:
         """Get the appropriate MCP client"""
@@ -73,6 +155,11 @@ class MCPOrchestrator:
         else:
             raise ValueError(f"Unknown MCP server: {server_name}")
     
+    def close(self):
+        """Close connection pools for all MCP clients"""
+        self.atlas_client.close()
+        self.common_client.close()
+    
     async def execute_abilities(self, abilities: List[str], server_name: str, state: AgentState) -> List[Dict[str, Any]]:
         """Execute multiple abilities on a specific MCP server"""
         client = self.get_client(server_name)
@@ -81,11 +168,63 @@ class MCPOrchestrator:
         for ability in abilities:
             # Prepare parameters based on current state
             parameters = self._prepare_parameters_for_ability(ability, state)
-            result = await client.execute_ability(ability, parameters)
+            with trace_span(f"ability.{ability}", kind='ability', server=server_name) as span:
+                result = await self._execute_with_limits(client, ability, parameters)
+                if span:
+                    span['attributes']['success'] = result.get('success', False)
+                    if not result.get('success', False):
+                        span['status'] = 'ERROR'
             results.append(result)
         
         return results
     
+    async def _execute_with_limits(self, client: MCPClient, ability: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute an ability once slots are available on its ability and server limiters"""
+        limiters = [
+            limiter for limiter in (
+                self.ability_limiters.get(f"{client.server_name}.{ability}"),
+                self.server_limiters.get(client.server_name)
+            ) if limiter
+        ]
+        
+        acquired = []
+        try:
+            with trace_span('queue_wait', kind='internal', server=client.server_name):
+                for limiter in limiters:
+                    await limiter.acquire()
+                    acquired.append(limiter)
+        except ConcurrencyLimitExceeded as e:
+            for limiter in acquired:
+                limiter.release()
+            logger.warning(f"Shed {ability} on {client.server_name}: {str(e)}")
+            return {
+                'success': False,
+                'error': f"Concurrency limit exceeded: {str(e)}",
+                'server': client.server_name,
+                'ability': ability
+            }
+        
+        # Timed on the loop clock so limits also adapt under a simulated clock
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = {'success': False}
+        try:
+            result = await client.execute_ability(ability, parameters)
+            return result
+        finally:
+            latency = loop.time() - started
+            for limiter in acquired:
+                limiter.release(latency, success=result.get('success', False))
+            if self.recorder:
+                self.recorder.record(client.server_name, ability, latency, result)
+    
+    def get_concurrency_metrics(self) -> Dict[str, Any]:
+        """Current limits, in-flight calls and queue depths for every limiter"""
+        return {
+            'servers': {name: limiter.snapshot() for name, limiter in self.server_limiters.items()},
+            'abilities': {name: limiter.snapshot() for name, limiter in self.ability_limiters.items()}
+        }
+    
     def _prepare_parameters_for_ability(self, ability: str, state: AgentState) -> Dict[str, Any]:
         """Prepare parameters for specific abilities based on current state"""
         base_params = {
@@ -38,6 +38,7 @@ class AgentWorkflowState(models.Model):
     current_stage = models.CharField(max_length=50, default='INTAKE')
     state_data = models.JSONField(default=dict)
     stage_logs = models.JSONField(default=list)
+    trace = models.JSONField(default=dict)
     is_complete = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
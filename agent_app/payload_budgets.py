@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import json
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from agent_app.schemas import PayloadBudget
+
+logger = logging.getLogger(__name__)
+
+SIDE_STORE_PREFIX = "payload"
+
+
+def side_store_cache():
+    """
+    Cache holding side-stored items, named by PAYLOAD_SIDE_STORE_CACHE.
+
+    Refs are written by worker processes and read back by the web process,
+    so a per-process local memory cache would silently lose every item.
+    """
+    alias = getattr(settings, 'PAYLOAD_SIDE_STORE_CACHE', 'payload_side_store')
+    if alias not in settings.CACHES:
+        raise ImproperlyConfigured(f"Payload side store cache '{alias}' is not configured in CACHES")
+    store = caches[alias]
+    if isinstance(store, LocMemCache):
+        raise ImproperlyConfigured(
+            f"Payload side store cache '{alias}' must be shared between processes, not LocMemCache"
+        )
+    return store
+
+
+def payload_size(value: Any) -> int:
+    """Size in bytes of a value as it is sent to MCP servers and persisted"""
+    return len(json.dumps(value, default=str).encode('utf-8'))
+
+
+def _score(item: Any, score_field: str) -> float:
+    """Numeric score of an item for ranking; missing or non-numeric scores rank last as 0"""
+    if not isinstance(item, dict):
+        return 0.0
+    try:
+        return float(item.get(score_field) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def apply_payload_budget(items: List[Dict[str, Any]], budget: PayloadBudget,
+                         ticket_id: str, field_name: str) -> Tuple[List[Dict[str, Any]], int, Dict[str, Any]]:
+    """
+    Trim a list of result items to the budget and return (trimmed_items, bytes_saved, side_store_entries).
+
+    Items are ranked by score and cut to top_k and long snippet fields are truncated.
+    With side_store only a projection (inline_fields, score and snippets) stays
+    inline next to a ref; the full original items are returned by ref for store_payloads().
+    """
+    original_size = payload_size(items)
+
+    # MCP servers may return scores as strings, so coerce before comparing
+    ranked = sorted(items, key=lambda item: _score(item, budget.score_field), reverse=True)
+    if budget.top_k is not None:
+        ranked = ranked[:budget.top_k]
+
+    side_store_entries = {}
+    trimmed = []
+    for rank, item in enumerate(ranked):
+        if not isinstance(item, dict):
+            trimmed.append(item)
+            continue
+
+        if budget.side_store:
+            inline_fields = {*budget.inline_fields, budget.score_field, *budget.snippet_fields, 'ref', 'truncated'}
+            trimmed_item = {key: value for key, value in item.items() if key in inline_fields}
+        else:
+            trimmed_item = dict(item)
+        if budget.max_snippet_chars is not None:
+            for snippet_field in budget.snippet_fields:
+                snippet = trimmed_item.get(snippet_field)
+                if isinstance(snippet, str) and len(snippet) > budget.max_snippet_chars:
+                    trimmed_item[snippet_field] = snippet[:budget.max_snippet_chars] + "…"
+                    trimmed_item['truncated'] = True
+
+        if budget.side_store and 'ref' not in item:
+            ref = f"{SIDE_STORE_PREFIX}:{ticket_id}:{field_name}:{rank}"
+            side_store_entries[ref] = item
+            trimmed_item['ref'] = ref
+
+        trimmed.append(trimmed_item)
+
+    bytes_saved = max(0, original_size - payload_size(trimmed))
+    return trimmed, bytes_saved, side_store_entries
+
+
+def _set_payloads(entries: Dict[str, Any], ttl: int):
+    # Looked up in the writing thread, since Django cache connections are per thread
+    side_store_cache().set_many(entries, timeout=ttl)
+
+
+async def store_payloads(entries: Dict[str, Any], ttl: int):
+    """Write side-stored items from the loop's executor, since cache backends do blocking I/O"""
+    if not entries:
+        return
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, functools.partial(_set_payloads, entries, ttl))
+
+
+def load_payload(ref: str) -> Optional[Dict[str, Any]]:
+    """Fetch the full item behind a side store reference, if it has not expired"""
+    return side_store_cache().get(ref)
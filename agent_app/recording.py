@@ -0,0 +1,154 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MCPRecorder:
+    """
+    Appends one JSON line per MCP ability call with its latency and outcome.
+
+    The file is the input for the capacity simulator, which replays these
+    latency and result distributions instead of calling live MCP servers.
+
+    record() only enqueues the call; a background thread serializes entries and
+    appends them in batches to a file it keeps open, so the event loop never
+    blocks on disk. When the queue is full new entries are dropped and counted.
+    """
+
+    def __init__(self, file_path: str, record_results: bool = True,
+                 max_result_bytes: Optional[int] = 65536, max_pending: int = 10000):
+        self.file_path = file_path
+        self.record_results = record_results
+        self.max_result_bytes = max_result_bytes
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='mcp-recorder', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, server: str, ability: str, latency: float, result: Dict[str, Any]):
+        if self._closed:
+            return
+        entry = {
+            'recorded_at': time.time(),
+            'server': server,
+            'ability': ability,
+            'latency': latency,
+            'success': result.get('success', False),
+            'error': result.get('error')
+        }
+        if self.record_results:
+            entry['data'] = result.get('data', {})
+
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending entries and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        if self.dropped:
+            logger.warning(f"⚠️ MCP recorder dropped {self.dropped} calls because the write queue was full")
+
+    def _write_loop(self):
+        try:
+            # Unbuffered so each batch is a single append and lines from
+            # several worker processes sharing the file never interleave
+            recording_file = open(self.file_path, 'ab', buffering=0)
+        except OSError as e:
+            logger.warning(f"Failed to open MCP recording file {self.file_path}: {str(e)}")
+            recording_file = None
+
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            for entry in batch:
+                if entry is None:
+                    stopping = True
+                    continue
+                line = self._serialize(entry)
+                if line:
+                    lines.append(line)
+
+            if recording_file and lines:
+                try:
+                    recording_file.write(''.join(lines).encode('utf-8'))
+                except OSError as e:
+                    logger.warning(f"Failed to write {len(lines)} MCP recordings: {str(e)}")
+
+        if recording_file:
+            recording_file.close()
+
+    def _serialize(self, entry: Dict[str, Any]) -> Optional[str]:
+        try:
+            line = json.dumps(entry, default=str)
+            if self.max_result_bytes is not None and 'data' in entry and len(line) > self.max_result_bytes:
+                # Keep the scalar fields routing decisions read (scores, flags) and drop bulky payloads
+                data = entry['data'] if isinstance(entry['data'], dict) else {}
+                entry['data'] = {
+                    key: value for key, value in data.items()
+                    if value is None or isinstance(value, (bool, int, float))
+                    or (isinstance(value, str) and len(value) <= 256)
+                }
+                entry['data_truncated'] = True
+                line = json.dumps(entry, default=str)
+            return line + '\n'
+        except (TypeError, ValueError, RuntimeError) as e:
+            logger.warning(f"Failed to serialize recording of {entry['ability']} on {entry['server']}: {str(e)}")
+            return None
+
+
+_recorder: Optional[MCPRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> Optional[MCPRecorder]:
+    """Return the process-wide recorder, or None when MCP_RECORDING is disabled"""
+    global _recorder
+    recording_config = getattr(settings, 'MCP_RECORDING', {})
+    if not recording_config.get('enabled', False):
+        return None
+
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MCPRecorder(
+                str(recording_config.get('file_path', 'mcp_recordings.jsonl')),
+                record_results=recording_config.get('record_results', True),
+                max_result_bytes=recording_config.get('max_result_bytes', 65536)
+            )
+    return _recorder
+
+
+def load_recordings(file_path: str) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    """Group recorded calls by (server, ability)"""
+    recordings: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    with open(file_path) as recording_file:
+        for line in recording_file:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            recordings[(entry['server'], entry['ability'])].append(entry)
+    return dict(recordings)
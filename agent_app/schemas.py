@@ -48,6 +48,18 @@ class AgentState(BaseModel):
     current_stage: str = "INTAKE"
     stage_logs: List[Dict[str, Any]] = []
     errors: List[str] = []
+    payload_bytes_saved: Dict[str, int] = {}
+
+class PayloadBudget(BaseModel):
+    """Size budget for a list-valued state field, enforced when stage results are merged"""
+    top_k: Optional[int] = None
+    score_field: str = "score"
+    max_snippet_chars: Optional[int] = None
+    snippet_fields: List[str] = ["snippet", "content", "text"]
+    # Fields kept inline alongside score, snippets and ref when side_store is on
+    inline_fields: List[str] = ["id", "title", "source", "url"]
+    side_store: bool = False
+    side_store_ttl: int = 86400
 
 class StageConfig(BaseModel):
     name: str
@@ -57,3 +69,4 @@ class StageConfig(BaseModel):
     prompt_template: str
     next_stage: Optional[str] = None
     condition_field: Optional[str] = None
+    payload_budgets: Dict[str, PayloadBudget] = {}
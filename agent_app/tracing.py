@@ -0,0 +1,344 @@
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_active_trace: contextvars.ContextVar = contextvars.ContextVar('workflow_trace', default=None)
+_current_span_id: contextvars.ContextVar = contextvars.ContextVar('workflow_span_id', default=None)
+
+# Slack when comparing span ends, since spans from worker processes are placed by wall clock
+CLOCK_TOLERANCE_MS = 0.5
+
+# Spans that run alongside the workflow without holding it up (e.g. progress writes made
+# from callback threads); they are shown in the waterfall but never on the critical path
+OFF_CRITICAL_PATH_KINDS = {'db.async'}
+
+
+class WorkflowTrace:
+    """
+    Collects spans for one workflow run.
+
+    Spans carry parent/child links, a wall-clock start for placing them on the
+    timeline and a monotonic (perf_counter) duration. A trace can be continued in
+    another process from its context() and the resulting spans merged back with
+    add_spans().
+    """
+
+    def __init__(self, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.parent_span_id = parent_span_id
+        self.root_span_id: Optional[str] = None
+        self.spans: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def activate(self):
+        """Make this the trace that trace_span() records into for the current context"""
+        trace_token = _active_trace.set(self)
+        span_token = _current_span_id.set(self.parent_span_id)
+        try:
+            yield self
+        finally:
+            _current_span_id.reset(span_token)
+            _active_trace.reset(trace_token)
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'internal', parent_id: Optional[str] = None, **attributes):
+        """Record a span around the enclosed block, nested under the current span"""
+        if parent_id is None:
+            if _active_trace.get() is self:
+                parent_id = _current_span_id.get()
+            parent_id = parent_id or self.root_span_id or self.parent_span_id
+
+        span = {
+            'span_id': uuid.uuid4().hex[:16],
+            'parent_id': parent_id,
+            'name': name,
+            'kind': kind,
+            'start_unix_nano': time.time_ns(),
+            'duration_ms': None,
+            'status': 'OK',
+            'attributes': attributes
+        }
+        if self.root_span_id is None and parent_id == self.parent_span_id:
+            self.root_span_id = span['span_id']
+        self.spans.append(span)
+
+        token = _current_span_id.set(span['span_id']) if _active_trace.get() is self else None
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span['status'] = 'ERROR'
+            span['attributes']['error'] = str(e)
+            raise
+        finally:
+            span['duration_ms'] = (time.perf_counter() - started) * 1000
+            if token is not None:
+                _current_span_id.reset(token)
+
+    def context(self) -> Dict[str, Optional[str]]:
+        """Propagation context for continuing this trace elsewhere"""
+        current = _current_span_id.get() if _active_trace.get() is self else None
+        return {'trace_id': self.trace_id, 'span_id': current or self.root_span_id or self.parent_span_id}
+
+    def add_spans(self, spans: List[Dict[str, Any]]):
+        self.spans.extend(spans)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'trace_id': self.trace_id, 'spans': self.spans}
+
+
+@contextmanager
+def trace_span(name: str, kind: str = 'internal', **attributes):
+    """Record a span on the active trace, or do nothing if no trace is active"""
+    trace = _active_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, kind, **attributes) as span:
+        yield span
+
+
+def build_waterfall(trace_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn a stored trace into waterfall rows ordered by start time, marking the critical path.
+
+    The critical path is found by walking back from the end of each span through the
+    child that finished last, then the child that finished last before that one started,
+    and so on, descending into every child picked. Spans of OFF_CRITICAL_PATH_KINDS
+    are never picked.
+    """
+    spans = [span for span in trace_data.get('spans', []) if span.get('duration_ms') is not None]
+    if not spans:
+        return {'trace_id': trace_data.get('trace_id'), 'total_ms': 0.0, 'critical_path': [], 'rows': []}
+
+    trace_start = min(span['start_unix_nano'] for span in spans)
+    by_id = {span['span_id']: span for span in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for span in spans:
+        parent_id = span.get('parent_id') if span.get('parent_id') in by_id else None
+        children.setdefault(parent_id, []).append(span)
+
+    def start_ms(span):
+        return (span['start_unix_nano'] - trace_start) / 1e6
+
+    def end_ms(span):
+        return start_ms(span) + span['duration_ms']
+
+    critical_ids = set()
+
+    def mark_critical(span):
+        critical_ids.add(span['span_id'])
+        cursor = None
+        for child in sorted(children.get(span['span_id'], []), key=end_ms, reverse=True):
+            if child['kind'] in OFF_CRITICAL_PATH_KINDS:
+                continue
+            if cursor is None or end_ms(child) <= cursor + CLOCK_TOLERANCE_MS:
+                mark_critical(child)
+                cursor = start_ms(child)
+
+    roots = children.get(None, [])
+    if roots:
+        mark_critical(max(roots, key=end_ms))
+
+    rows = []
+
+    def add_rows(span, depth):
+        rows.append({
+            'span_id': span['span_id'],
+            'parent_id': span.get('parent_id'),
+            'name': span['name'],
+            'kind': span['kind'],
+            'depth': depth,
+            'offset_ms': round(start_ms(span), 3),
+            'duration_ms': round(span['duration_ms'], 3),
+            'status': span.get('status', 'OK'),
+            'critical': span['span_id'] in critical_ids,
+            'attributes': span.get('attributes', {})
+        })
+        for child in sorted(children.get(span['span_id'], []), key=start_ms):
+            add_rows(child, depth + 1)
+
+    for root in sorted(roots, key=start_ms):
+        add_rows(root, 0)
+
+    critical_path = [
+        {'name': row['name'], 'kind': row['kind'], 'duration_ms': row['duration_ms']}
+        for row in sorted((row for row in rows if row['critical']), key=lambda row: (row['offset_ms'], row['depth']))
+    ]
+    return {
+        'trace_id': trace_data.get('trace_id'),
+        'total_ms': round(max(end_ms(span) for span in spans), 3),
+        'critical_path': critical_path,
+        'rows': rows
+    }
+
+
+_OTLP_SPAN_KINDS = {'internal': 1, 'workflow': 2, 'stage': 1, 'ability': 3, 'db': 3, 'db.async': 3}
+
+
+def _to_otlp(trace_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode a trace as an OTLP/HTTP JSON ExportTraceServiceRequest"""
+    otlp_spans = []
+    for span in trace_data.get('spans', []):
+        if span.get('duration_ms') is None:
+            continue
+        otlp_span = {
+            'traceId': trace_data['trace_id'],
+            'spanId': span['span_id'],
+            'name': span['name'],
+            'kind': _OTLP_SPAN_KINDS.get(span['kind'], 1),
+            'startTimeUnixNano': str(span['start_unix_nano']),
+            'endTimeUnixNano': str(span['start_unix_nano'] + int(span['duration_ms'] * 1e6)),
+            'attributes': [
+                {'key': key, 'value': {'stringValue': str(value)}}
+                for key, value in {'workflow.span_kind': span['kind'], **span.get('attributes', {})}.items()
+            ],
+            'status': {'code': 2 if span.get('status') == 'ERROR' else 1}
+        }
+        if span.get('parent_id'):
+            otlp_span['parentSpanId'] = span['parent_id']
+        otlp_spans.append(otlp_span)
+
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'orchestrator'}}]},
+            'scopeSpans': [{'scope': {'name': 'agent_app'}, 'spans': otlp_spans}]
+        }]
+    }
+
+
+class TraceExporter:
+    """
+    Exports finished traces from one background thread.
+
+    export() only enqueues the trace; the writer thread appends each batch of traces
+    to the file with a single unbuffered write, so lines from several processes never
+    interleave, or posts the batch to the OTLP collector in one request. When the queue
+    is full (e.g. while the collector is slow) new traces are dropped and counted.
+    """
+
+    def __init__(self, exporter: str, file_path: str = 'traces.jsonl',
+                 otlp_endpoint: str = 'http://localhost:4318/v1/traces', max_pending: int = 1000):
+        self.exporter = exporter
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._writer = threading.Thread(target=self._export_loop, name='trace-exporter', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def export(self, trace_data: Dict[str, Any]):
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait(trace_data)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """Export pending traces and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        if self.dropped:
+            logger.warning(f"⚠️ Trace exporter dropped {self.dropped} traces because the export queue was full")
+
+    def _export_loop(self):
+        trace_file = None
+        if self.exporter == 'file':
+            try:
+                trace_file = open(self.file_path, 'ab', buffering=0)
+            except OSError as e:
+                logger.warning(f"Failed to open trace file {self.file_path}: {str(e)}")
+
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            traces = []
+            for trace_data in batch:
+                if trace_data is None:
+                    stopping = True
+                else:
+                    traces.append(trace_data)
+            if traces:
+                self._export_batch(traces, trace_file)
+
+        if trace_file:
+            trace_file.close()
+
+    def _export_batch(self, traces: List[Dict[str, Any]], trace_file):
+        if self.exporter == 'file':
+            if trace_file is None:
+                return
+            lines = ''.join(json.dumps(trace_data, default=str) + '\n' for trace_data in traces)
+            try:
+                trace_file.write(lines.encode('utf-8'))
+            except OSError as e:
+                logger.warning(f"Failed to write {len(traces)} traces: {str(e)}")
+        elif self.exporter == 'otlp':
+            import requests
+
+            resource_spans = [
+                resource for trace_data in traces for resource in _to_otlp(trace_data)['resourceSpans']
+            ]
+            try:
+                requests.post(
+                    self.otlp_endpoint,
+                    json={'resourceSpans': resource_spans},
+                    headers={'Content-Type': 'application/json'},
+                    timeout=5
+                )
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Failed to export {len(traces)} traces: {str(e)}")
+        else:
+            logger.warning(f"Unknown trace exporter: {self.exporter}")
+
+
+_exporter: Optional[TraceExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_trace_exporter() -> Optional[TraceExporter]:
+    """Return the process-wide trace exporter, or None when WORKFLOW_TRACING has no exporter"""
+    global _exporter
+    from django.conf import settings
+
+    tracing_config = getattr(settings, 'WORKFLOW_TRACING', {})
+    exporter = tracing_config.get('exporter')
+    if not exporter:
+        return None
+
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = TraceExporter(
+                exporter,
+                file_path=str(tracing_config.get('file_path', 'traces.jsonl')),
+                otlp_endpoint=tracing_config.get('otlp_endpoint', 'http://localhost:4318/v1/traces')
+            )
+    return _exporter
+
+
+def export_trace(trace_data: Dict[str, Any]):
+    """Queue a finished trace for the exporter configured in WORKFLOW_TRACING"""
+    exporter = get_trace_exporter()
+    if exporter:
+        exporter.export(trace_data)
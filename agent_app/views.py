@@ -5,10 +5,15 @@ from rest_framework import status
 import asyncio
 import json
 import logging
+import os
 
 from agent_app.schemas import CustomerSupportInput
 from agent_app.lang_graph_agent import LangGraphCustomerSupportAgent
 from agent_app.models import CustomerSupportTicket, AgentWorkflowState
+from agent_app.worker_pool import get_worker_pool, WorkerPoolError
+from agent_app.tracing import WorkflowTrace, trace_span, build_waterfall, export_trace
+from agent_app.payload_budgets import load_payload
+from agent_app.mcp_clients import get_shared_limiters
 
 logger = logging.getLogger(__name__)
 
@@ -21,51 +26,89 @@ def process_support_request(request):
         # Validate input data
         input_data = CustomerSupportInput(**request.data)
         
-        # Create database records
-        ticket = CustomerSupportTicket.objects.create(
-            customer_name=input_data.customer_name,
-            customer_email=input_data.customer_email,
-            query=input_data.query,
-            priority=input_data.priority.value,
-            status='in_progress'
-        )
+        trace = WorkflowTrace()
+        with trace.activate(), trace_span('workflow', kind='workflow') as root_span:
+            # Create database records
+            with trace_span('db.create_ticket', kind='db'):
+                ticket = CustomerSupportTicket.objects.create(
+                    customer_name=input_data.customer_name,
+                    customer_email=input_data.customer_email,
+                    query=input_data.query,
+                    priority=input_data.priority.value,
+                    status='in_progress'
+                )
+            
+            # Update input with ticket ID
+            input_data.ticket_id = str(ticket.ticket_id)
+            root_span['attributes']['ticket_id'] = input_data.ticket_id
+            
+            # Initialize workflow state
+            with trace_span('db.create_workflow_state', kind='db'):
+                workflow_state = AgentWorkflowState.objects.create(
+                    ticket=ticket,
+                    current_stage='INTAKE',
+                    state_data={'initialized': True}
+                )
+            
+            worker_pool = get_worker_pool()
+            if worker_pool:
+                # Hand off to the sharded worker pool and track stage progress as it arrives
+                def on_progress(log_entry):
+                    workflow_state.current_stage = log_entry['stage']
+                    with trace.span('db.update_current_stage', kind='db.async', stage=log_entry['stage']):
+                        AgentWorkflowState.objects.filter(pk=workflow_state.pk).update(
+                            current_stage=log_entry['stage']
+                        )
+                
+                try:
+                    result = worker_pool.run(input_data, progress_callback=on_progress, trace_context=trace.context())
+                except WorkerPoolError as e:
+                    # Record the failure below like any failed workflow instead of leaving it in progress
+                    logger.error(f"Worker pool failed ticket {input_data.ticket_id}: {str(e)}")
+                    root_span['status'] = 'ERROR'
+                    result = {
+                        'success': False,
+                        'error': str(e),
+                        'ticket_id': input_data.ticket_id,
+                        'stage_logs': []
+                    }
+            else:
+                # Initialize and run the Lang Graph Agent
+                agent = LangGraphCustomerSupportAgent()
+                
+                # Run the async workflow
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                result = loop.run_until_complete(
+                    agent.process_customer_support_request(input_data, trace_context=trace.context())
+                )
+                loop.close()
+                agent.mcp_orchestrator.close()
+            
+            trace.add_spans(result.pop('trace', {}).get('spans', []))
+            
+            # Update database with results
+            with trace_span('db.save_workflow_state', kind='db'):
+                workflow_state.is_complete = result.get('success', False)
+                workflow_state.stage_logs = result.get('stage_logs', [])
+                workflow_state.state_data.update({
+                    'final_result': result,
+                    'completed_at': str(workflow_state.updated_at)
+                })
+                workflow_state.save()
+            
+            # Update ticket status
+            with trace_span('db.save_ticket', kind='db'):
+                if result.get('success'):
+                    ticket.status = 'resolved'
+                else:
+                    ticket.status = 'new'
+                ticket.save()
         
-        # Update input with ticket ID
-        input_data.ticket_id = str(ticket.ticket_id)
-        
-        # Initialize workflow state
-        workflow_state = AgentWorkflowState.objects.create(
-            ticket=ticket,
-            current_stage='INTAKE',
-            state_data={'initialized': True}
-        )
-        
-        # Initialize and run the Lang Graph Agent
-        agent = LangGraphCustomerSupportAgent()
-        
-        # Run the async workflow
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
-            agent.process_customer_support_request(input_data)
-        )
-        loop.close()
-        
-        # Update database with results
-        workflow_state.is_complete = result.get('success', False)
-        workflow_state.stage_logs = result.get('stage_logs', [])
-        workflow_state.state_data.update({
-            'final_result': result,
-            'completed_at': str(workflow_state.updated_at)
-        })
-        workflow_state.save()
-        
-        # Update ticket status
-        if result.get('success'):
-            ticket.status = 'resolved'
-        else:
-            ticket.status = 'new'
-        ticket.save()
+        # Persist the finished trace; this write is the one part of the request it cannot cover
+        trace_data = trace.to_dict()
+        AgentWorkflowState.objects.filter(pk=workflow_state.pk).update(trace=trace_data)
+        export_trace(trace_data)
         
         return Response({
             'success': result.get('success', False),
@@ -97,6 +140,7 @@ def get_workflow_status(request, workflow_id):
             'current_stage': workflow.current_stage,
             'is_complete': workflow.is_complete,
             'stage_logs': workflow.stage_logs,
+            'waterfall': build_waterfall(workflow.trace),
             'state_data': workflow.state_data,
             'created_at': workflow.created_at,
             'updated_at': workflow.updated_at
@@ -107,6 +151,49 @@ def get_workflow_status(request, workflow_id):
             'error': 'Workflow not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+def get_payload_item(request, ref):
+    """
+    Get the full result item behind a payload budget side store ref
+    """
+    try:
+        item = load_payload(ref)
+    except Exception as e:
+        logger.error(f"Error loading side-stored payload {ref}: {str(e)}")
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    if item is None:
+        return Response({
+            'error': 'Payload not found or expired'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({'ref': ref, 'item': item})
+
+@api_view(['GET'])
+def concurrency_metrics(request):
+    """
+    Current adaptive concurrency limits and queue depths per MCP server and ability
+    """
+    worker_pool = get_worker_pool()
+    try:
+        if not worker_pool:
+            # Requests run in this process and share its limiters
+            server_limiters, ability_limiters = get_shared_limiters()
+            return Response({'shards': [{
+                'shard': None,
+                'pid': os.getpid(),
+                'servers': {name: limiter.snapshot() for name, limiter in server_limiters.items()},
+                'abilities': {name: limiter.snapshot() for name, limiter in ability_limiters.items()}
+            }]})
+        return Response({'shards': worker_pool.get_concurrency_metrics()})
+    except Exception as e:
+        logger.error(f"Error collecting concurrency metrics: {str(e)}")
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
 @api_view(['GET'])
 def demo_run(request):
     """
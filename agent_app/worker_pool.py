@@ -0,0 +1,488 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import wait as wait_for_sentinels
+from typing import Dict, List, Any, Callable, Optional
+
+from django.conf import settings
+
+from agent_app.schemas import CustomerSupportInput
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+class WorkerPoolError(RuntimeError):
+    """Raised when the pool cannot deliver a result: worker death, timeout, shutdown or a job crash"""
+
+
+def shard_for_ticket(ticket_id: str, num_shards: int) -> int:
+    """Map a ticket to a worker shard with a hash that is stable across processes"""
+    return zlib.crc32(ticket_id.encode('utf-8')) % num_shards
+
+
+def _worker_main(shard_index: int, num_shards: int, inbox, outbox):
+    """Entry point of a worker process: set up Django, then run the long-lived event loop"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+    try:
+        asyncio.run(_worker_loop(shard_index, num_shards, inbox, outbox))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(shard_index: int, num_shards: int, inbox, outbox):
+    """Pull jobs off the shard inbox and run them concurrently on one agent"""
+    # Imported here so the graph and MCP connection pools are built inside the worker
+    from agent_app.lang_graph_agent import LangGraphCustomerSupportAgent
+    from agent_app.mcp_clients import concurrency_shards_per_process
+
+    loop = asyncio.get_running_loop()
+    # Each shard enforces its share of its web process's share of the MCP concurrency limits
+    agent = LangGraphCustomerSupportAgent(concurrency_shards=num_shards * concurrency_shards_per_process())
+    running = set()
+    logger.info(f"👷 Worker shard {shard_index} started (pid {os.getpid()})")
+
+    try:
+        while True:
+            message = await loop.run_in_executor(None, inbox.get)
+            if message is None:
+                break
+
+            kind, job_id, payload = message
+            if kind == 'metrics':
+                outbox.send(('result', job_id, {
+                    'shard': shard_index,
+                    'pid': os.getpid(),
+                    'running_workflows': len(running),
+                    **agent.mcp_orchestrator.get_concurrency_metrics()
+                }))
+                continue
+
+            task = asyncio.create_task(_run_job(agent, job_id, payload, outbox))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    finally:
+        agent.mcp_orchestrator.close()
+        logger.info(f"👷 Worker shard {shard_index} stopped")
+
+
+async def _run_job(agent, job_id: str, payload: Dict[str, Any], outbox):
+    """Run a single workflow and forward its progress and result to the parent"""
+    try:
+        input_data = CustomerSupportInput(**payload['input'])
+        result = await agent.process_customer_support_request(
+            input_data,
+            progress_callback=lambda log_entry: outbox.send(('progress', job_id, log_entry)),
+            trace_context=payload.get('trace_context')
+        )
+        outbox.send(('result', job_id, result))
+    except Exception as e:
+        logger.error(f"Job {job_id} failed in worker: {str(e)}")
+        outbox.send(('error', job_id, str(e)))
+
+
+class WorkflowWorkerPool:
+    """
+    Runs workflows across a pool of worker processes, sharded by ticket_id.
+
+    Each worker owns a long-lived event loop, one agent and its MCP connection pools,
+    so CPU-bound work (validation, serialization, merging) spreads across cores.
+    Progress and results come back over one pipe per worker, written only from the
+    worker's event loop, so a worker dying mid-write cannot block the others.
+    """
+
+    def __init__(self, processes: Optional[int] = None, start_method: Optional[str] = None):
+        pool_config = getattr(settings, 'WORKFLOW_WORKER_POOL', {})
+        self.processes = processes or pool_config.get('processes') or os.cpu_count() or 1
+        self.start_method = start_method or pool_config.get('start_method', 'spawn')
+        self.callback_threads = pool_config.get('callback_threads', 8)
+        # Workers that die within min_worker_uptime of starting are restarted with exponential
+        # backoff; after max_quick_restarts such deaths in a row the shard is marked failed
+        self.min_worker_uptime = pool_config.get('min_worker_uptime', 10.0)
+        self.restart_backoff = pool_config.get('restart_backoff', 1.0)
+        self.max_restart_backoff = pool_config.get('max_restart_backoff', 30.0)
+        self.max_quick_restarts = pool_config.get('max_quick_restarts', 5)
+
+        if self.start_method == 'fork':
+            # Workers are (re)started while the listener and supervisor threads run
+            logger.warning("Forking worker processes from a threaded parent can deadlock; use 'spawn' or 'forkserver'")
+        self._context = multiprocessing.get_context(self.start_method)
+        self._inboxes: List[Any] = []
+        self._workers: List[Any] = []
+        # Read ends of each worker's result pipe; None once the worker has exited
+        self._result_readers: List[Any] = []
+        self._wakeup_reader, self._wakeup_writer = None, None
+        self._listener: Optional[threading.Thread] = None
+        self._supervisor: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._spawned_at: Dict[int, float] = {}
+        self._quick_deaths: Dict[int, int] = {}
+        # Shards with no running worker, and why; jobs for them fail immediately
+        self._down_shards: Dict[int, str] = {}
+        self._futures: Dict[str, Future] = {}
+        self._job_shards: Dict[str, int] = {}
+        self._progress_callbacks: Dict[str, ProgressCallback] = {}
+        # Progress entries waiting for a job's callback; a job is present while its
+        # callbacks are draining, and its result is held back until they finish
+        self._callback_queues: Dict[str, deque] = {}
+        self._held_results: Dict[str, tuple] = {}
+        self._callback_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> 'WorkflowWorkerPool':
+        """Spawn the worker processes and the result listener thread"""
+        if self._started:
+            return self
+
+        self._stopping.clear()
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        # Callbacks of one job run in order on one thread at a time; different jobs run in parallel
+        self._callback_executor = ThreadPoolExecutor(
+            max_workers=self.callback_threads, thread_name_prefix="workflow-pool-callbacks"
+        )
+        for shard_index in range(self.processes):
+            inbox, result_reader, worker = self._spawn_worker(shard_index)
+            self._inboxes.append(inbox)
+            self._result_readers.append(result_reader)
+            self._workers.append(worker)
+
+        self._listener = threading.Thread(target=self._listen, name="workflow-pool-listener", daemon=True)
+        self._listener.start()
+        self._supervisor = threading.Thread(target=self._supervise, name="workflow-pool-supervisor", daemon=True)
+        self._supervisor.start()
+        self._started = True
+        logger.info(f"🚀 Started workflow worker pool with {self.processes} processes")
+        return self
+
+    def _spawn_worker(self, shard_index: int):
+        inbox = self._context.Queue()
+        result_reader, result_writer = self._context.Pipe(duplex=False)
+        worker = self._context.Process(
+            target=_worker_main,
+            args=(shard_index, self.processes, inbox, result_writer),
+            name=f"workflow-worker-{shard_index}",
+            daemon=True
+        )
+        worker.start()
+        # Only the worker holds the write end now, so its exit shows up as EOF on the reader
+        result_writer.close()
+        self._spawned_at[shard_index] = time.monotonic()
+        return inbox, result_reader, worker
+
+    def _wake_listener(self):
+        """Make the listener pick up replaced result pipes or notice shutdown"""
+        try:
+            self._wakeup_writer.send(None)
+        except OSError:
+            pass
+
+    def _supervise(self):
+        """Fail the pending jobs of any worker that dies and start a replacement, backing off on crash loops"""
+        restart_due: Dict[int, float] = {}
+        while not self._stopping.is_set():
+            with self._lock:
+                workers = list(self._workers)
+                down_shards = set(self._down_shards)
+            sentinels = [worker.sentinel for index, worker in enumerate(workers) if index not in down_shards]
+            timeout = 1.0
+            if restart_due:
+                timeout = max(0.0, min(timeout, min(restart_due.values()) - time.monotonic()))
+            if sentinels:
+                wait_for_sentinels(sentinels, timeout=timeout)
+            else:
+                self._stopping.wait(timeout)
+            if self._stopping.is_set():
+                break
+
+            for shard_index, worker in enumerate(workers):
+                if shard_index in down_shards or worker.is_alive():
+                    continue
+                delay = self._handle_worker_death(shard_index, worker)
+                if delay is not None:
+                    restart_due[shard_index] = time.monotonic() + delay
+
+            now = time.monotonic()
+            for shard_index, due in list(restart_due.items()):
+                if due > now:
+                    continue
+                del restart_due[shard_index]
+                with self._lock:
+                    inbox, result_reader, replacement = self._spawn_worker(shard_index)
+                    self._inboxes[shard_index] = inbox
+                    self._result_readers[shard_index] = result_reader
+                    self._workers[shard_index] = replacement
+                    self._down_shards.pop(shard_index, None)
+                self._wake_listener()
+                logger.info(f"🔁 Restarted worker shard {shard_index}")
+
+    def _handle_worker_death(self, shard_index: int, worker) -> Optional[float]:
+        """Mark a dead worker's shard down and fail its jobs; return the restart delay, or None to give up"""
+        uptime = time.monotonic() - self._spawned_at.get(shard_index, 0.0)
+        if uptime < self.min_worker_uptime:
+            self._quick_deaths[shard_index] = self._quick_deaths.get(shard_index, 0) + 1
+        else:
+            self._quick_deaths[shard_index] = 0
+        quick_deaths = self._quick_deaths[shard_index]
+
+        if quick_deaths > self.max_quick_restarts:
+            reason = (f"Worker shard {shard_index} failed: died {quick_deaths} times within "
+                      f"{self.min_worker_uptime}s of starting (last exit code {worker.exitcode})")
+            logger.critical(f"🛑 {reason}; not restarting it")
+            delay = None
+        else:
+            delay = 0.0 if not quick_deaths else min(
+                self.max_restart_backoff, self.restart_backoff * 2 ** (quick_deaths - 1)
+            )
+            reason = f"Worker shard {shard_index} died (exit code {worker.exitcode})"
+            logger.error(f"💥 {reason}, restarting in {delay:.1f}s")
+
+        with self._lock:
+            # Jobs still queued in the dead worker's inbox go down with it
+            self._down_shards[shard_index] = reason
+            lost_jobs = [job_id for job_id, shard in self._job_shards.items() if shard == shard_index]
+            lost_futures = [self._pop_job(job_id) for job_id in lost_jobs]
+        for future in lost_futures:
+            if future and not future.done():
+                future.set_exception(WorkerPoolError(reason))
+        return delay
+
+    def shard_for(self, ticket_id: str) -> int:
+        return shard_for_ticket(ticket_id, self.processes)
+
+    def submit(self, input_data: CustomerSupportInput,
+               progress_callback: Optional[ProgressCallback] = None,
+               trace_context: Optional[Dict[str, Optional[str]]] = None) -> Future:
+        """Queue a workflow on the shard owning its ticket and return a future for the result"""
+        _, future = self._submit_workflow(input_data, progress_callback, trace_context)
+        return future
+
+    def _submit_workflow(self, input_data: CustomerSupportInput,
+                         progress_callback: Optional[ProgressCallback],
+                         trace_context: Optional[Dict[str, Optional[str]]]):
+        if not self._started:
+            raise RuntimeError("Worker pool is not started")
+
+        if not input_data.ticket_id:
+            input_data.ticket_id = str(uuid.uuid4())
+
+        return self._dispatch(self.shard_for(input_data.ticket_id), 'run', {
+            'input': input_data.dict(),
+            'trace_context': trace_context
+        }, progress_callback)
+
+    def get_concurrency_metrics(self, timeout: float = 5) -> List[Dict[str, Any]]:
+        """Collect MCP concurrency limits and queue depths from every worker shard"""
+        if not self._started:
+            raise RuntimeError("Worker pool is not started")
+
+        jobs = [self._dispatch(shard_index, 'metrics', None) for shard_index in range(self.processes)]
+        try:
+            return [future.result(timeout=timeout) for _, future in jobs]
+        except FutureTimeoutError:
+            with self._lock:
+                for job_id, _ in jobs:
+                    self._pop_job(job_id)
+            raise WorkerPoolError(f"Worker shards did not report metrics within {timeout}s") from None
+
+    def _dispatch(self, shard_index: int, kind: str, payload: Optional[Dict[str, Any]],
+                  progress_callback: Optional[ProgressCallback] = None):
+        """Register a job and put it on its shard's inbox under the lock the supervisor restarts under"""
+        job_id = str(uuid.uuid4())
+        future: Future = Future()
+        with self._lock:
+            if shard_index in self._down_shards:
+                future.set_exception(WorkerPoolError(self._down_shards[shard_index]))
+                return job_id, future
+            self._futures[job_id] = future
+            self._job_shards[job_id] = shard_index
+            if progress_callback:
+                self._progress_callbacks[job_id] = progress_callback
+            self._inboxes[shard_index].put((kind, job_id, payload))
+        return job_id, future
+
+    def _pop_job(self, job_id: str) -> Optional[Future]:
+        """Forget a job; callers must hold self._lock"""
+        self._job_shards.pop(job_id, None)
+        self._progress_callbacks.pop(job_id, None)
+        return self._futures.pop(job_id, None)
+
+    def run(self, input_data: CustomerSupportInput,
+            progress_callback: Optional[ProgressCallback] = None,
+            timeout: Optional[float] = None,
+            trace_context: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """Submit a workflow and block until its result is available
+
+        Raises WorkerPoolError if the workflow times out or its worker dies.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'WORKFLOW_WORKER_POOL', {}).get('result_timeout')
+        job_id, future = self._submit_workflow(input_data, progress_callback, trace_context)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._pop_job(job_id)
+            raise WorkerPoolError(f"Workflow for ticket {input_data.ticket_id} did not finish within {timeout}s") from None
+
+    def _listen(self):
+        """Dispatch progress and results from workers to callbacks and futures
+
+        Only dispatches: progress callbacks (which may write to the DB) are chained
+        per job on the callback executor. A job's result waits for its own callbacks,
+        and a slow callback only delays other jobs once every callback thread is busy.
+        """
+        while True:
+            with self._lock:
+                readers = [reader for reader in self._result_readers if reader is not None]
+            if not readers and self._stopping.is_set():
+                break
+
+            for connection in wait_for_sentinels(readers + [self._wakeup_reader], timeout=1.0):
+                if connection is self._wakeup_reader:
+                    self._wakeup_reader.recv()
+                    continue
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # The worker exited; the supervisor fails its jobs and replaces it
+                    with self._lock:
+                        if connection in self._result_readers:
+                            self._result_readers[self._result_readers.index(connection)] = None
+                    connection.close()
+                    continue
+                self._handle_message(*message)
+
+    def _handle_message(self, kind: str, job_id: str, body: Any):
+        if kind == 'progress':
+            with self._lock:
+                callback = self._progress_callbacks.get(job_id)
+                if callback:
+                    pending = self._callback_queues.get(job_id)
+                    if pending is None:
+                        pending = self._callback_queues[job_id] = deque()
+                        self._callback_executor.submit(self._drain_callbacks, job_id, callback)
+                    pending.append(body)
+            return
+
+        with self._lock:
+            future = self._pop_job(job_id)
+            if future is not None and job_id in self._callback_queues:
+                self._held_results[job_id] = (future, kind, body)
+                return
+        if future is not None:
+            self._resolve(future, kind, body)
+
+    def _drain_callbacks(self, job_id: str, callback: ProgressCallback):
+        """Run a job's queued progress callbacks in order, then release its held result"""
+        while True:
+            with self._lock:
+                pending = self._callback_queues[job_id]
+                if not pending:
+                    del self._callback_queues[job_id]
+                    held = self._held_results.pop(job_id, None)
+                    break
+                log_entry = pending.popleft()
+            self._run_progress_callback(job_id, callback, log_entry)
+
+        if held:
+            self._resolve(*held)
+
+    @staticmethod
+    def _run_progress_callback(job_id: str, callback: ProgressCallback, log_entry: Dict[str, Any]):
+        from django.db import close_old_connections
+
+        # Callback threads are long-lived, so drop the DB connection they open like a request would
+        close_old_connections()
+        try:
+            callback(log_entry)
+        except Exception as e:
+            logger.warning(f"Progress callback failed for job {job_id}: {str(e)}")
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def _resolve(future: Future, kind: str, body: Any):
+        if future.done():
+            return
+        if kind == 'result':
+            future.set_result(body)
+        else:
+            future.set_exception(WorkerPoolError(f"Workflow failed in worker: {body}"))
+
+    def shutdown(self, timeout: float = 30):
+        """Let workers drain their queues, then stop them and the listener"""
+        if not self._started:
+            return
+
+        self._stopping.set()
+        self._supervisor.join(timeout)
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+
+        # Workers have exited, so their pipes reach EOF and the listener drains and stops
+        self._wake_listener()
+        self._listener.join(timeout)
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+        self._callback_executor.shutdown(wait=True)
+
+        with self._lock:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(WorkerPoolError("Worker pool shut down"))
+            self._futures.clear()
+            self._job_shards.clear()
+            self._progress_callbacks.clear()
+            self._callback_queues.clear()
+            self._held_results.clear()
+
+        for reader in self._result_readers:
+            if reader is not None:
+                reader.close()
+        self._inboxes, self._result_readers, self._workers = [], [], []
+        self._down_shards.clear()
+        self._quick_deaths.clear()
+        self._started = False
+        logger.info("🛑 Workflow worker pool stopped")
+
+    def __enter__(self) -> 'WorkflowWorkerPool':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+_worker_pool: Optional[WorkflowWorkerPool] = None
+_worker_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> Optional[WorkflowWorkerPool]:
+    """Return the process-wide worker pool, starting it on first use, or None if disabled"""
+    global _worker_pool
+    if not getattr(settings, 'WORKFLOW_WORKER_POOL', {}).get('enabled', False):
+        return None
+
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = WorkflowWorkerPool().start()
+    return _worker_pool
@@ -1,4 +1,4 @@
-from agent_app.schemas import StageConfig, StageMode, MCPServer
+from agent_app.schemas import StageConfig, StageMode, MCPServer, PayloadBudget
 
 # Lang Graph Agent Configuration
 WORKFLOW_STAGES = {
@@ -49,7 +49,15 @@ WORKFLOW_STAGES = {
         abilities=['knowledge_base_search', 'store_data'],
         mcp_server=MCPServer.ATLAS,
         prompt_template="Search knowledge base and store relevant data",
-        next_stage='DECIDE'
+        next_stage='DECIDE',
+        payload_budgets={
+            # Keep only the best hits inline; full results live in the side store
+            'knowledge_base_results': PayloadBudget(
+                top_k=5,
+                max_snippet_chars=500,
+                side_store=True
+            )
+        }
     ),
     'DECIDE': StageConfig(
         name='DECIDE',
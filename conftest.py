@@ -0,0 +1,4 @@
+import os
+
+# Tests that touch Django settings use the project settings module
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
@@ -37,18 +37,106 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Full items behind payload budget refs; written by pool workers and read by the
+    # web process, so it must be shared. The file-based cache only suits one host at low
+    # volume: past MAX_ENTRIES it culls at random regardless of side_store_ttl, and it scans
+    # its directory on every write. Size MAX_ENTRIES to workflows per side_store_ttl times
+    # refs per workflow (top_k), and use Redis (django.core.cache.backends.redis.RedisCache)
+    # in production
+    'payload_side_store': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'payload_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000
+        }
+    }
+}
+
+PAYLOAD_SIDE_STORE_CACHE = 'payload_side_store'
+
 # MCP Configuration
 MCP_SERVERS = {
     'atlas': {
         'url': 'http://localhost:8001/mcp',
-        'capabilities': ['external_api', 'database_operations', 'notifications']
+        'capabilities': ['external_api', 'database_operations', 'notifications'],
+        # Adaptive (AIMD) limit on outstanding calls, tuned to keep latency near target_latency.
+        # Totals for the deployment, split between web processes and worker pool processes
+        'concurrency': {
+            'initial_limit': 10,
+            'min_limit': 1,
+            'max_limit': 100,
+            'target_latency': 1.0,
+            'max_queue': 200,
+            'queue_timeout': 5.0
+        },
+        # Optional tighter limits for individual abilities
+        'ability_concurrency': {
+            'knowledge_base_search': {
+                'initial_limit': 5,
+                'max_limit': 50,
+                'target_latency': 2.0
+            }
+        }
     },
     'common': {
         'url': 'http://localhost:8002/mcp',
-        'capabilities': ['text_processing', 'calculations', 'validations']
+        'capabilities': ['text_processing', 'calculations', 'validations'],
+        'concurrency': {
+            'initial_limit': 20,
+            'min_limit': 1,
+            'max_limit': 200,
+            'target_latency': 0.5,
+            'max_queue': 500,
+            'queue_timeout': 5.0
+        }
     }
 }
 
+# Worker pool configuration (multi-process workflow execution sharded by ticket_id)
+# Sharing of the MCP concurrency limits. Every process that calls MCP servers enforces its
+# share of the configured limits; set web_processes to the number of web server processes
+# (e.g. gunicorn workers), or the real ceiling is web_processes times the configured limits
+MCP_CONCURRENCY = {
+    'web_processes': 1
+}
+
+WORKFLOW_WORKER_POOL = {
+    'enabled': False,
+    'processes': os.cpu_count() or 1,
+    'start_method': 'spawn',
+    'result_timeout': 300,
+    # Threads running progress callbacks (DB writes) in the web process; one job's callbacks run in order
+    'callback_threads': 8,
+    # Workers dying within min_worker_uptime seconds are restarted with exponential backoff
+    # (restart_backoff doubling up to max_restart_backoff); after max_quick_restarts the shard fails
+    'min_worker_uptime': 10.0,
+    'restart_backoff': 1.0,
+    'max_restart_backoff': 30.0,
+    'max_quick_restarts': 5
+}
+
+# Workflow tracing: spans per workflow, stage, ability call and DB write.
+# 'exporter' is None (store with the workflow only), 'file' (JSON lines) or 'otlp' (OTLP/HTTP JSON)
+WORKFLOW_TRACING = {
+    'exporter': None,
+    'file_path': BASE_DIR / 'traces.jsonl',
+    'otlp_endpoint': 'http://localhost:4318/v1/traces'
+}
+
+# Recording mode: append per-ability latency and results to a JSON-lines file
+# for replay by the capacity simulator (agent_app/capacity_simulator.py)
+MCP_RECORDING = {
+    'enabled': False,
+    'file_path': BASE_DIR / 'mcp_recordings.jsonl',
+    'record_results': True,
+    # Larger results keep only their scalar fields; None records them in full
+    'max_result_bytes': 65536
+}
+
 # Celery Configuration (for async processing)
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
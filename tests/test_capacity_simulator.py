@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import pytest
+
+from agent_app.capacity_simulator import ReplayMCPClient, VirtualTimeEventLoop, _run_arrivals
+
+
+def _run(coro_factory):
+    loop = VirtualTimeEventLoop()
+    try:
+        return loop.run_until_complete(coro_factory(loop)), loop.time()
+    finally:
+        loop.close()
+
+
+def test_sleeps_finish_instantly_in_virtual_time():
+    finished = []
+
+    async def sleeper(loop, name, seconds):
+        await asyncio.sleep(seconds)
+        finished.append((name, loop.time()))
+
+    async def main(loop):
+        await asyncio.gather(sleeper(loop, 'long', 3600), sleeper(loop, 'short', 60), sleeper(loop, 'mid', 600))
+
+    started = time.monotonic()
+    _, now = _run(main)
+
+    assert time.monotonic() - started < 1
+    # Concurrent sleeps overlap, so the clock ends at the longest one rather than their sum
+    assert finished == [('short', 60), ('mid', 600), ('long', 3600)]
+    assert now == 3600
+
+
+def test_timeouts_fire_at_their_virtual_deadline():
+    async def main(loop):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.sleep(100), timeout=5)
+        return loop.time()
+
+    timed_out_at, _ = _run(main)
+    assert timed_out_at == 5
+
+
+def test_waiting_on_nothing_scheduled_is_reported_as_a_stall():
+    async def main(loop):
+        await loop.create_future()
+
+    with pytest.raises(RuntimeError, match='stalled'):
+        _run(main)
+
+
+async def _timed(loop, coro):
+    started = loop.time()
+    result = await coro
+    return result, loop.time() - started
+
+
+def test_replay_client_sleeps_recorded_latency_and_replays_outcome():
+    client = ReplayMCPClient('atlas', {
+        ('atlas', 'search'): [{'latency': 2.0, 'success': True, 'data': {'hits': 3}}],
+        ('atlas', 'notify'): [{'latency': 4.0, 'success': False, 'error': 'timeout'}]
+    }, seed=1, default_latency=0.5)
+
+    (result, elapsed), _ = _run(lambda loop: _timed(loop, client.execute_ability('search', {})))
+    assert (elapsed, result['success'], result['data']) == (2.0, True, {'hits': 3})
+
+    (result, elapsed), _ = _run(lambda loop: _timed(loop, client.execute_ability('notify', {})))
+    assert (elapsed, result['success'], result['error']) == (4.0, False, 'timeout')
+
+    # Abilities missing from the recording take the median latency and succeed
+    (result, elapsed), _ = _run(lambda loop: _timed(loop, client.execute_ability('classify', {})))
+    assert (elapsed, result['success']) == (0.5, True)
+    assert client.unrecorded_abilities == {'classify'}
+
+
+def test_server_concurrency_queues_calls_beyond_capacity():
+    recordings = {('atlas', 'search'): [{'latency': 1.0, 'success': True, 'data': {}}]}
+    client = ReplayMCPClient('atlas', recordings, seed=0, default_latency=1.0, server_concurrency=2)
+
+    async def main(loop):
+        await asyncio.gather(*(client.execute_ability('search', {}) for _ in range(5)))
+
+    _, now = _run(main)
+    assert now == 3.0
+
+
+def test_replay_samples_do_not_depend_on_call_interleaving():
+    def latencies(order):
+        client = ReplayMCPClient('atlas', {
+            ('atlas', 'a'): [{'latency': float(i), 'success': True} for i in range(1, 20)],
+            ('atlas', 'b'): [{'latency': float(i), 'success': True} for i in range(1, 20)]
+        }, seed=7, default_latency=1.0)
+        seen = {'a': [], 'b': []}
+
+        async def main(loop):
+            for ability in order:
+                _, elapsed = await _timed(loop, client.execute_ability(ability, {}))
+                seen[ability].append(elapsed)
+
+        _run(main)
+        return seen
+
+    assert latencies('aabbab') == latencies('ababab')
+
+
+def test_arrivals_report_queueing_on_virtual_time():
+    pytest.importorskip('pydantic')
+
+    class FixedAgent:
+        async def process_customer_support_request(self, input_data):
+            await asyncio.sleep(10)
+            return {'success': True, 'stage_logs': [{'stage': 'INTAKE', 'server_calls': []}]}
+
+    report, _ = _run(lambda loop: _run_arrivals(FixedAgent(), arrival_rate=10.0, concurrency=1,
+                                                num_workflows=5, seed=0, priority_mix={'medium': 1.0}))
+
+    # Each workflow takes 10s on one slot, so arrivals a fraction of a second apart queue up
+    assert report['failed'] == 0
+    assert report['max_queue_depth'] >= 3
+    assert report['service_time_s']['p50'] == 10
+    assert report['stage_visits'] == {'INTAKE': 5}
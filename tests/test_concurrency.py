@@ -0,0 +1,197 @@
+import asyncio
+import threading
+
+import pytest
+
+from agent_app.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+
+
+def _limiter(**options):
+    config = {'initial_limit': 4, 'min_limit': 1, 'max_limit': 8, 'target_latency': 1.0,
+              'max_queue': 10, 'queue_timeout': 1.0}
+    config.update(options)
+    return AdaptiveConcurrencyLimiter('test', **config)
+
+
+def _fill(limiter, slots):
+    async def take():
+        for _ in range(slots):
+            await limiter.acquire()
+    asyncio.run(take())
+
+
+def test_limit_grows_by_about_one_per_window_only_when_saturated():
+    limiter = _limiter()
+    _fill(limiter, 4)
+
+    # Each fast call finishing at the limit adds 1/limit, so about one slot per window of calls
+    for _ in range(5):
+        limiter.release(0.1)
+        _fill(limiter, 1)
+    assert limiter.limit == 5
+
+    # Fast calls below the limit say nothing about spare capacity
+    limiter.release(0.1)
+    before = limiter._limit
+    limiter.release(0.1)
+    assert limiter._limit == before
+
+
+def test_limit_is_capped_at_max_limit():
+    limiter = _limiter(initial_limit=8, max_limit=8)
+    _fill(limiter, 8)
+    for _ in range(20):
+        limiter.release(0.1)
+        _fill(limiter, 1)
+    assert limiter.limit == 8
+
+
+def test_slow_or_failed_calls_back_off_once_per_latency_window():
+    limiter = _limiter(initial_limit=8, backoff_ratio=0.5)
+    _fill(limiter, 3)
+
+    limiter.release(2.0)
+    assert limiter.limit == 4
+    # Calls that started before the decrease took effect do not shrink it again
+    limiter.release(2.0)
+    limiter.release(0.1, success=False)
+    assert limiter.limit == 4
+
+
+def test_backoff_stops_at_min_limit():
+    limiter = _limiter(initial_limit=2, min_limit=2, backoff_ratio=0.1)
+    _fill(limiter, 1)
+    limiter.release(5.0)
+    assert limiter.limit == 2
+
+
+def test_release_without_latency_leaves_limit_alone():
+    limiter = _limiter()
+    _fill(limiter, 4)
+    limiter.release()
+    assert limiter._limit == 4
+    assert limiter.completed == 0
+    assert limiter.in_flight == 3
+
+
+def test_shards_split_limits_and_queue():
+    limiter = _limiter(initial_limit=10, min_limit=1, max_limit=100, max_queue=200, shards=8)
+    assert (limiter.limit, limiter.min_limit, limiter.max_limit, limiter.max_queue) == (2, 1, 13, 25)
+
+
+def test_waiters_are_served_in_order():
+    limiter = _limiter(initial_limit=1, max_limit=1)
+    order = []
+
+    async def call(name):
+        await limiter.acquire()
+        order.append(name)
+        await asyncio.sleep(0)
+        limiter.release(0.1)
+
+    async def main():
+        await asyncio.gather(*(call(name) for name in 'abcd'))
+
+    asyncio.run(main())
+    assert order == list('abcd')
+    assert limiter.in_flight == 0
+
+
+def test_full_queue_rejects_immediately():
+    limiter = _limiter(initial_limit=1, max_limit=1, max_queue=1)
+
+    async def main():
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitExceeded, match='queue full'):
+            await limiter.acquire()
+        limiter.release()
+        await queued
+
+    asyncio.run(main())
+    assert limiter.rejected == 1
+    assert limiter.in_flight == 1
+
+
+def test_queue_timeout_rejects_and_forgets_the_waiter():
+    limiter = _limiter(initial_limit=1, max_limit=1, queue_timeout=0.01)
+
+    async def main():
+        await limiter.acquire()
+        with pytest.raises(ConcurrencyLimitExceeded, match='no slot'):
+            await limiter.acquire()
+
+    asyncio.run(main())
+    assert limiter.queue_depth == 0
+    assert limiter.rejected == 1
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    limiter = _limiter(initial_limit=1, max_limit=1)
+
+    async def main():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.queue_depth == 0
+        limiter.release()
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_handed_back():
+    limiter = _limiter(initial_limit=1, max_limit=1)
+
+    async def main():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # The waiter is cancelled, then handed the slot before the cancellation reaches it
+        waiter.cancel()
+        limiter.release()
+        assert limiter.in_flight == 1
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0
+    assert limiter.queue_depth == 0
+
+
+def test_limit_holds_across_threads_and_event_loops():
+    limiter = _limiter(initial_limit=3, max_limit=3, max_queue=1000)
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    async def call():
+        await limiter.acquire()
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        await asyncio.sleep(0.001)
+        with lock:
+            active['now'] -= 1
+        limiter.release(0.001)
+
+    def run_loop():
+        async def main():
+            await asyncio.gather(*(call() for _ in range(20)))
+        asyncio.run(main())
+
+    threads = [threading.Thread(target=run_loop) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert active['max'] == 3
+    assert limiter.in_flight == 0
+    assert limiter.completed == 80
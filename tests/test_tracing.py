@@ -0,0 +1,130 @@
+import json
+import threading
+
+from agent_app.tracing import TraceExporter, build_waterfall
+
+START_NS = 1_700_000_000_000_000_000
+
+
+def _trace(*spans):
+    """Build a stored trace from (span_id, parent_id, kind, start_ms, end_ms) tuples"""
+    return {
+        'trace_id': 'trace-1',
+        'spans': [
+            {
+                'span_id': span_id,
+                'parent_id': parent_id,
+                'name': span_id,
+                'kind': kind,
+                'start_unix_nano': START_NS + int(start_ms * 1e6),
+                'duration_ms': end_ms - start_ms,
+                'status': 'OK',
+                'attributes': {}
+            }
+            for span_id, parent_id, kind, start_ms, end_ms in spans
+        ]
+    }
+
+
+def _critical(waterfall):
+    return [step['name'] for step in waterfall['critical_path']]
+
+
+def test_critical_path_follows_the_last_finishing_chain():
+    waterfall = build_waterfall(_trace(
+        ('workflow', None, 'workflow', 0, 100),
+        ('db.create_ticket', 'workflow', 'db', 0, 5),
+        ('stage.INTAKE', 'workflow', 'stage', 5, 40),
+        ('ability.fast', 'stage.INTAKE', 'ability', 5, 20),
+        ('ability.slow', 'stage.INTAKE', 'ability', 5, 38),
+        ('stage.RETRIEVE', 'workflow', 'stage', 40, 95),
+        ('ability.search', 'stage.RETRIEVE', 'ability', 41, 94),
+        ('db.save_ticket', 'workflow', 'db', 95, 100),
+    ))
+
+    assert _critical(waterfall) == [
+        'workflow', 'db.create_ticket', 'stage.INTAKE', 'ability.slow',
+        'stage.RETRIEVE', 'ability.search', 'db.save_ticket'
+    ]
+    assert waterfall['total_ms'] == 100
+    assert [row['depth'] for row in waterfall['rows']] == [0, 1, 1, 2, 2, 1, 2, 1]
+
+
+def test_span_starting_inside_the_tolerance_stays_on_the_path():
+    # Spans from worker processes are placed by wall clock and may overlap slightly
+    waterfall = build_waterfall(_trace(
+        ('workflow', None, 'workflow', 0, 100),
+        ('workflow.run', 'workflow', 'workflow', 0, 90.3),
+        ('db.save_ticket', 'workflow', 'db', 90, 100),
+    ))
+
+    assert _critical(waterfall) == ['workflow', 'workflow.run', 'db.save_ticket']
+
+
+def test_async_progress_writes_never_take_over_the_critical_path():
+    # In the pool path progress writes are siblings of workflow.run; the last one can
+    # finish after workflow.run ends, while the result waits for callbacks to drain
+    waterfall = build_waterfall(_trace(
+        ('workflow', None, 'workflow', 0, 100),
+        ('db.create_workflow_state', 'workflow', 'db', 0, 4),
+        ('workflow.run', 'workflow', 'workflow', 4, 90),
+        ('stage.INTAKE', 'workflow.run', 'stage', 4, 50),
+        ('stage.RESOLVE', 'workflow.run', 'stage', 50, 90),
+        ('db.update_current_stage.1', 'workflow', 'db.async', 48, 52),
+        ('db.update_current_stage.2', 'workflow', 'db.async', 89, 91.5),
+        ('db.save_workflow_state', 'workflow', 'db', 92, 100),
+    ))
+
+    assert _critical(waterfall) == [
+        'workflow', 'db.create_workflow_state', 'workflow.run',
+        'stage.INTAKE', 'stage.RESOLVE', 'db.save_workflow_state'
+    ]
+    progress_rows = [row for row in waterfall['rows'] if row['kind'] == 'db.async']
+    assert len(progress_rows) == 2
+    assert not any(row['critical'] for row in progress_rows)
+
+
+def test_unfinished_spans_are_left_out():
+    trace = _trace(('workflow', None, 'workflow', 0, 10))
+    trace['spans'].append(dict(trace['spans'][0], span_id='open', parent_id='workflow', duration_ms=None))
+
+    waterfall = build_waterfall(trace)
+    assert [row['span_id'] for row in waterfall['rows']] == ['workflow']
+    assert build_waterfall({'trace_id': 'empty', 'spans': []})['rows'] == []
+
+
+def test_file_exporter_appends_whole_lines_from_one_thread(tmp_path):
+    file_path = tmp_path / 'traces.jsonl'
+    exporter = TraceExporter('file', file_path=str(file_path))
+    big = 'x' * 20000
+
+    def export_many(thread_index):
+        for i in range(25):
+            exporter.export({'trace_id': f"{thread_index}-{i}", 'spans': [], 'padding': big})
+
+    threads = [threading.Thread(target=export_many, args=(thread_index,)) for thread_index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    exporter.close()
+
+    trace_ids = [json.loads(line)['trace_id'] for line in file_path.read_text().splitlines()]
+    assert sorted(trace_ids) == sorted(f"{t}-{i}" for t in range(4) for i in range(25))
+    assert [thread.name for thread in threading.enumerate()].count('trace-exporter') == 0
+
+
+def test_full_export_queue_drops_traces():
+    release = threading.Event()
+
+    class StalledExporter(TraceExporter):
+        def _export_batch(self, traces, trace_file):
+            release.wait(5)
+
+    exporter = StalledExporter('otlp', max_pending=2)
+    for i in range(10):
+        exporter.export({'trace_id': str(i), 'spans': []})
+    # One trace may already be with the stalled writer, the rest wait in the queue or are dropped
+    assert exporter.dropped >= 7
+    release.set()
+    exporter.close()
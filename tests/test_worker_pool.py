@@ -0,0 +1,121 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('django')
+pytest.importorskip('pydantic')
+
+from agent_app import worker_pool
+from agent_app.schemas import CustomerSupportInput
+from agent_app.worker_pool import WorkflowWorkerPool, WorkerPoolError, shard_for_ticket
+
+
+def _echo_worker(shard_index, num_shards, inbox, outbox):
+    """Stand-in worker: reports one stage, then echoes the query; 'crash' kills the process"""
+    while True:
+        message = inbox.get()
+        if message is None:
+            return
+        kind, job_id, payload = message
+        query = payload['input']['query']
+        if query == 'crash':
+            os._exit(3)
+        if query == 'hang':
+            continue
+        outbox.send(('progress', job_id, {'stage': 'INTAKE'}))
+        outbox.send(('result', job_id, {'success': True, 'query': query, 'shard': shard_index}))
+
+
+def _dying_worker(shard_index, num_shards, inbox, outbox):
+    os._exit(1)
+
+
+def _input(query, ticket_id='ticket-1'):
+    return CustomerSupportInput(
+        customer_name="Test Customer",
+        customer_email="customer@example.com",
+        query=query,
+        ticket_id=ticket_id
+    )
+
+
+@pytest.fixture
+def pool_factory(monkeypatch):
+    pools = []
+
+    def factory(target, processes=1, **options):
+        monkeypatch.setattr(worker_pool, '_worker_main', target)
+        pool = WorkflowWorkerPool(processes=processes, start_method='spawn')
+        for name, value in options.items():
+            setattr(pool, name, value)
+        pools.append(pool.start())
+        return pool
+
+    yield factory
+    for pool in pools:
+        pool.shutdown(timeout=5)
+
+
+def test_shard_for_ticket_is_stable_and_in_range():
+    shards = [shard_for_ticket(f"ticket-{i}", 4) for i in range(200)]
+    assert shards == [shard_for_ticket(f"ticket-{i}", 4) for i in range(200)]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_result_is_delivered_after_progress_callbacks(pool_factory):
+    pool = pool_factory(_echo_worker)
+    seen = []
+
+    def on_progress(log_entry):
+        time.sleep(0.2)
+        seen.append(log_entry['stage'])
+
+    result = pool.run(_input('hello'), progress_callback=on_progress, timeout=30)
+    assert result['query'] == 'hello'
+    assert seen == ['INTAKE']
+
+
+def _run_when_up(pool, query, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return pool.run(_input(query), timeout=timeout)
+        except WorkerPoolError:
+            # Submitted while the shard was still down
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+
+
+def test_dead_worker_fails_its_jobs_and_is_restarted(pool_factory):
+    pool = pool_factory(_echo_worker, min_worker_uptime=0.0)
+
+    # Crashing right after sending a result must not wedge result delivery for the replacement
+    for attempt in range(3):
+        assert _run_when_up(pool, f"before crash {attempt}")['query'] == f"before crash {attempt}"
+        with pytest.raises(WorkerPoolError, match='died'):
+            pool.run(_input('crash'), timeout=30)
+
+    assert _run_when_up(pool, 'after restart')['query'] == 'after restart'
+    assert not pool._futures
+
+
+def test_timed_out_job_is_forgotten(pool_factory):
+    pool = pool_factory(_echo_worker)
+    with pytest.raises(WorkerPoolError, match='did not finish'):
+        pool.run(_input('hang'), progress_callback=lambda log_entry: None, timeout=0.5)
+    assert not pool._futures
+    assert not pool._progress_callbacks
+
+
+def test_crash_looping_shard_backs_off_then_fails(pool_factory):
+    pool = pool_factory(_dying_worker, restart_backoff=0.05, max_restart_backoff=0.2, max_quick_restarts=2)
+
+    deadline = time.monotonic() + 30
+    while 0 not in pool._down_shards or 'failed' not in pool._down_shards[0]:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    assert pool._quick_deaths[0] == 3
+    with pytest.raises(WorkerPoolError, match='failed'):
+        pool.run(_input('anything'), timeout=5)